@@ -23,7 +23,7 @@ from bisimulation.formula import (
     Variable,
 )
 from program.expression import Concatenate
-from program.parser_program import ParserProgram
+from program.parser_program import TERMINAL_STATES, ParserProgram
 
 logger = logging.getLogger(__name__)
 
@@ -86,8 +86,10 @@ def _get_trace(
         if len(buffer_vars_smt) == 0:
             counterexample = "N/A (no buffered input)"
         elif len(buffer_vars_smt) == 1:
-            val = model.get_value(buffer_vars_smt[0]).constant_value()
-            length = len(buffer_vars[0]) if buffer_vars else 0
+            (buffer_var_smt,) = buffer_vars_smt
+            (buffer_var,) = buffer_vars
+            val = model.get_value(buffer_var_smt).constant_value()
+            length = len(buffer_var)
             counterexample = bin(val) + '\n' + f"Length: {length} bits"
         else:
             val = model.get_value(pysmt.BVConcat(*buffer_vars_smt)).constant_value()
@@ -108,11 +110,41 @@ def _is_terminal(state_name: str) -> bool:
     :param state_name: the state to check
     :return: True if the state is terminal, False otherwise
     """
-    return state_name in ["accept", "reject"]
+    return state_name in TERMINAL_STATES
+
+
+def _is_valid(solver: Any, formula: Any, cache: dict[Any, bool]) -> bool:
+    """
+    Check whether a formula is valid, reusing the result of an identical query.
+
+    pysmt formulas are hash-consed, so structurally equal queries are the same
+    node and can be used as cache keys directly.
+
+    :param solver: a solver instance to check validity
+    :param formula: the pysmt formula to check
+    :param cache: a mapping of previously checked formulas to their validity
+    :return: True if the formula is valid, False otherwise
+    """
+    valid = cache.get(formula)
+    if valid is None:
+        valid = solver.is_valid(formula)
+        cache[formula] = valid
+    return valid
+
+
+def _exists_smt(pf: PureFormula) -> Any:
+    """
+    Get the SMT representation of a pure formula with its fresh variables quantified.
+
+    :param pf: the pure formula to convert
+    :return: the existentially quantified SMT formula
+    """
+    return pysmt.Exists([v.to_smt() for v in pf.exists_vars()], pf.to_smt())
 
 
 def _has_new_information(
-        solver: Any, relevant_pfs: set[PureFormula], guarded_form: GuardedFormula, manager: FormulaManager
+        solver: Any, relevant_pfs: set[PureFormula], guarded_form: GuardedFormula, manager: FormulaManager,
+        cache: dict[Any, bool],
 ) -> bool:
     """
     Check if the guarded formula contains new information.
@@ -120,20 +152,46 @@ def _has_new_information(
     :param solver: a solver instance to check satisfiability
     :param relevant_pfs: a set of relevant, previously seen pure formulas
     :param guarded_form: the guarded formula to check
+    :param cache: a mapping of previously checked formulas to their validity
     :return: True if the guarded formula contains new information, False otherwise
     """
-    lhs = pysmt.Exists(
-        [v.to_smt() for v in guarded_form.pf.exists_vars()],
-        guarded_form.pf.to_smt(),
-    )
-    rhs = pysmt.Or(*[
-        pysmt.Exists(
-            [v.to_smt() for v in pf.exists_vars()],
-            pf.to_smt(),
+    lhs = _exists_smt(guarded_form.pf)
+    rhs = pysmt.Or(*[_exists_smt(pf) for pf in relevant_pfs])
+    return not _is_valid(solver, pysmt.Implies(lhs, rhs), cache)
+
+
+def _drop_subsumed(
+        solver: Any,
+        knowledge: set[GuardedFormula],
+        guarded_form: GuardedFormula,
+        cache: dict[Any, bool],
+) -> None:
+    """
+    Remove the known guarded formulas that are subsumed by a new one.
+
+    A known guarded formula is subsumed if it has the same guard and its pure
+    formula implies that of the new guarded formula, as anything it covers is
+    then covered by the new one as well. The initial guarded formula is kept,
+    as it anchors the certificate.
+
+    :param solver: a solver instance to check validity
+    :param knowledge: the set of known guarded formulas to prune
+    :param guarded_form: the new guarded formula
+    :param cache: a mapping of previously checked formulas to their validity
+    """
+    new_smt = _exists_smt(guarded_form.pf)
+    subsumed = [
+        seen_guarded_form
+        for seen_guarded_form in knowledge
+        if seen_guarded_form.prev_guarded_formula is not None
+        and guarded_form.has_equal_guard(seen_guarded_form)
+        and _is_valid(
+            solver, pysmt.Implies(_exists_smt(seen_guarded_form.pf), new_smt), cache
         )
-        for pf in relevant_pfs
-    ])
-    return not solver.is_valid(pysmt.Implies(lhs, rhs))
+    ]
+    for seen_guarded_form in subsumed:
+        logger.debug("Dropping subsumed guarded formula: %s", seen_guarded_form)
+        knowledge.discard(seen_guarded_form)
 
 
 def extend_buffer(
@@ -210,6 +268,7 @@ def check_certificate(
         )
 
     manager = FormulaManager(count_up=False)
+    cache: dict[Any, bool] = {}
 
     for guarded_form in knowledge:
         current_pf = guarded_form.pf
@@ -226,7 +285,7 @@ def check_certificate(
                 )
 
             filter_smt = constraint_to_smt(filter_disagreeing, parser1, parser2)
-            if not solver.is_valid(pysmt.Implies(current_pf.to_smt(), filter_smt)):
+            if not _is_valid(solver, pysmt.Implies(current_pf.to_smt(), filter_smt), cache):
                 relevant_pfs = _get_relevant_formulas(knowledge, guarded_form)
                 return False, (
                         "Certificate is invalid: TGF violates the disagreement filter.\n"
@@ -236,7 +295,7 @@ def check_certificate(
 
         if state_l == "accept" and state_r == "accept" and filter_accepting is not None:
             filter_smt = constraint_to_smt(filter_accepting, parser1, parser2)
-            if not solver.is_valid(pysmt.Implies(current_pf.to_smt(), filter_smt)):
+            if not _is_valid(solver, pysmt.Implies(current_pf.to_smt(), filter_smt), cache):
                 relevant_pfs = _get_relevant_formulas(knowledge, guarded_form)
                 return False, (
                         "Certificate is invalid: TGF violates the acceptance filter.\n"
@@ -320,7 +379,7 @@ def check_certificate(
                     successor_pf, guarded_form,
                 )
                 relevant_pfs = _get_relevant_formulas(knowledge, successor)
-                if _has_new_information(solver, relevant_pfs, successor, manager):
+                if _has_new_information(solver, relevant_pfs, successor, manager, cache):
                     return False, (
                             f"Certificate is invalid: successor "
                             f"(state_l={to_l!r}, state_r={to_r!r}, "
@@ -343,6 +402,7 @@ def symbolic_bisimulation(
         filter_disagreeing: Any = None,
         validate_certificate: bool = False,
         to_time: bool = False,
+        enable_subsumption: bool = False,
 ) -> tuple[bool, str]:
     """
     Check whether two P4 packet parsers are bisimilar using symbolic execution.
@@ -362,9 +422,12 @@ def symbolic_bisimulation(
            check_certificate() before returning; raises AssertionError if the
            certificate produced by this function is found to be invalid
     :param to_time: whether to time certificate generation and validation
+    :param enable_subsumption: whether to drop known guarded formulas that are
+           subsumed by newly found ones, trading SMT queries for smaller ones
     :return: a boolean indicating bisimilarity, and seen formulas or a counterexample
     """
     manager = FormulaManager()
+    cache: dict[Any, bool] = {}
     knowledge: set[GuardedFormula] = set()
     work_queue = deque([GuardedFormula.initial_guard()])
     gen_start = time.perf_counter() if to_time else None
@@ -374,11 +437,13 @@ def symbolic_bisimulation(
             current_pf = guarded_form.pf
             relevant_pfs = _get_relevant_formulas(knowledge, guarded_form)
 
-            if not _has_new_information(s, relevant_pfs, guarded_form, manager):
+            if not _has_new_information(s, relevant_pfs, guarded_form, manager, cache):
                 logger.debug(
-                    f"Considered guarded formula information known: {guarded_form}"
+                    "Considered guarded formula information known: %s", guarded_form
                 )
                 continue
+            if enable_subsumption:
+                _drop_subsumed(s, knowledge, guarded_form, cache)
 
             state_l = guarded_form.state_l
             state_r = guarded_form.state_r
@@ -387,9 +452,9 @@ def symbolic_bisimulation(
                     return False, _get_trace(s, relevant_pfs, guarded_form)
 
                 filter_smt = constraint_to_smt(filter_disagreeing, parser1, parser2)
-                if not s.is_valid(pysmt.Implies(current_pf.to_smt(), filter_smt)):
+                if not _is_valid(s, pysmt.Implies(current_pf.to_smt(), filter_smt), cache):
                     logger.debug(
-                        f"Guarded formula violates disagreement filter: {guarded_form}"
+                        "Guarded formula violates disagreement filter: %s", guarded_form
                     )
                     return False, _get_trace(s, relevant_pfs, guarded_form)
                 else:
@@ -398,9 +463,9 @@ def symbolic_bisimulation(
 
             if state_l == "accept" and state_r == "accept" and filter_accepting is not None:
                 filter_smt = constraint_to_smt(filter_accepting, parser1, parser2)
-                if not s.is_valid(pysmt.Implies(current_pf.to_smt(), filter_smt)):
+                if not _is_valid(s, pysmt.Implies(current_pf.to_smt(), filter_smt), cache):
                     logger.debug(
-                        f"Guarded formula violates accepting filter: {guarded_form}"
+                        "Guarded formula violates accepting filter: %s", guarded_form
                     )
                     return False, _get_trace(s, relevant_pfs, guarded_form)
 
@@ -446,10 +511,13 @@ def symbolic_bisimulation(
             transition_l = not terminal_l and (buf_len_l + leap == op_size_l)
             transition_r = not terminal_r and (buf_len_r + leap == op_size_r)
             logger.info(
-                f"Equivalence checking loop status\n"
-                f"Left - state: {state_l}, op. size: {op_size_l}, transitioning: {transition_l}\n"
-                f"Right - state: {state_r}, op. size: {op_size_r}, transitioning: {transition_r}\n"
-                f"Leap size: {leap}\n"
+                "Equivalence checking loop status\n"
+                "Left - state: %s, op. size: %s, transitioning: %s\n"
+                "Right - state: %s, op. size: %s, transitioning: %s\n"
+                "Leap size: %s\n",
+                state_l, op_size_l, transition_l,
+                state_r, op_size_r, transition_r,
+                leap,
             )
 
             if transition_l:
@@ -142,11 +142,7 @@ def constraint_to_smt(constraint: Any, parser1: ParserProgram, parser2: ParserPr
     else:
         expr = UNINIT
 
-    logger.debug(
-        "\n"
-        f"Constraint: {constraint}\n"
-        f"SMT: {expr}"
-    )
+    logger.debug("\nConstraint: %s\nSMT: %s", constraint, expr)
     if expr is UNINIT:
         return pysmt.TRUE()
     return expr
@@ -9,9 +9,10 @@ License: MIT (See LICENSE file or https://opensource.org/licenses/MIT for detail
 
 from __future__ import annotations
 
+import functools
 import logging
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, Sequence
 
 import pysmt.shortcuts as pysmt
 
@@ -23,9 +24,26 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=1 << 16)
+def _bv_symbol(name: str, size: int) -> Any:
+    """
+    Get the SMT bit-vector symbol of a variable.
+
+    Variables are lowered to SMT in every query they occur in, so their pysmt
+    symbols (which belong to the global pysmt environment) are created once.
+
+    :param name: the name of the variable
+    :param size: the bit-width of the variable
+    :return: the pysmt symbol
+    """
+    return pysmt.Symbol(f"{name}_{size}", pysmt.BVType(size))
+
+
 class FormulaNode(ABC, ReprMixin):
     """An abstract base class for formula nodes in symbolic execution."""
 
+    __slots__ = ()
+
     @abstractmethod
     def to_smt(self) -> Any:
         """
@@ -63,14 +81,19 @@ class FormulaNode(ABC, ReprMixin):
 
 
 class Variable(FormulaNode):
+    __slots__ = ("name", "_size", "_hash")
+
     def __init__(self, name: str, size: int):
         if size <= 0:
             raise ValueError("Size of variable must be greater than 0")
         self.name = name
         self._size = size
+        # Variables are the keys of every substitution mapping, so their hash is
+        # computed once instead of on every lookup
+        self._hash = hash((name, size))
 
     def to_smt(self) -> Any:
-        return pysmt.Symbol(f'{self.name}_{self._size}', pysmt.BVType(self._size))
+        return _bv_symbol(self.name, self._size)
 
     def used_vars(self) -> set[Variable]:
         return {self}
@@ -78,15 +101,13 @@ class Variable(FormulaNode):
     def substitute(
             self, mapping: dict[Variable, FormulaNode]
     ) -> FormulaNode:
-        if self in mapping:
-            return mapping[self]
-        return self
+        return mapping.get(self, self)
 
     def __len__(self):
         return self._size
 
     def __hash__(self):
-        return hash((self.name, self._size))
+        return self._hash
 
     def __eq__(self, other: FormulaNode | None) -> bool:
         if other is None:
@@ -100,11 +121,17 @@ class Variable(FormulaNode):
 
 
 class Not(FormulaNode):
+    __slots__ = ("subformula", "_smt")
+
     def __init__(self, subformula: FormulaNode):
         self.subformula = subformula
+        self._smt = None
 
     def to_smt(self) -> Any:
-        return pysmt.Not(self.subformula.to_smt())
+        smt = self._smt
+        if smt is None:
+            smt = self._smt = pysmt.Not(self.subformula.to_smt())
+        return smt
 
     def used_vars(self) -> set[Variable]:
         return self.subformula.used_vars()
@@ -112,19 +139,58 @@ class Not(FormulaNode):
     def substitute(
             self, mapping: dict[Variable, FormulaNode]
     ) -> FormulaNode:
-        return Not(self.subformula.substitute(mapping))
+        subformula = self.subformula.substitute(mapping)
+        if subformula is self.subformula:
+            return self
+        return Not(subformula)
 
     def __str__(self):
         return f"~({self.subformula})"
 
 
 class And(FormulaNode):
+    __slots__ = ("left", "right", "_smt")
+
     def __init__(self, left: FormulaNode, right: FormulaNode):
         self.left = left
         self.right = right
+        # Formulas grow by conjunction, so their SMT terms are kept on the (never
+        # modified) nodes to only lower the new parts in later queries
+        self._smt = None
+
+    def _left_spine(self) -> list[And]:
+        """
+        Get the conjunctions on the left spine of this one, outermost first.
+
+        Formulas grow by adding conjuncts on the right, so long formulas are deep
+        along their left spine. Walking it iteratively avoids deep recursion.
+
+        :return: the list of And nodes, starting with this one
+        """
+        spine = []
+        node = self
+        while isinstance(node, And):
+            spine.append(node)
+            node = node.left
+        return spine
 
     def to_smt(self) -> Any:
-        return pysmt.And(self.left.to_smt(), self.right.to_smt())
+        smt = self._smt
+        if smt is not None:
+            return smt
+
+        # Only lower the conjunctions that were not lowered in an earlier query,
+        # bottom-up so every left operand is available when its parent needs it
+        spine = []
+        node = self
+        while isinstance(node, And) and node._smt is None:
+            spine.append(node)
+            node = node.left
+        for conjunction in reversed(spine):
+            smt = conjunction._smt = pysmt.And(
+                conjunction.left.to_smt(), conjunction.right.to_smt()
+            )
+        return smt
 
     def used_vars(self) -> set[Variable]:
         return self.left.used_vars() | self.right.used_vars()
@@ -132,16 +198,24 @@ class And(FormulaNode):
     def substitute(
             self, mapping: dict[Variable, FormulaNode]
     ) -> FormulaNode:
-        return And(
-            self.left.substitute(mapping),
-            self.right.substitute(mapping),
-        )
+        spine = self._left_spine()
+        result = spine[-1].left.substitute(mapping)
+        for conjunction in reversed(spine):
+            right = conjunction.right.substitute(mapping)
+            if result is conjunction.left and right is conjunction.right:
+                # Nothing was substituted, so the (immutable) node can be reused
+                result = conjunction
+            else:
+                result = And(result, right)
+        return result
 
     def __str__(self):
         return f"({self.left}) & ({self.right})"
 
 
 class TRUE(FormulaNode):
+    __slots__ = ()
+
     def to_smt(self) -> Any:
         return pysmt.TRUE()
 
@@ -151,22 +225,28 @@ class TRUE(FormulaNode):
     def substitute(
             self, mapping: dict[Variable, FormulaNode]
     ) -> FormulaNode:
-        return TRUE()
+        return self
 
     def __str__(self):
         return "TRUE"
 
 
 class Equals(FormulaNode):
+    __slots__ = ("left", "right", "_smt")
+
     def __init__(self, left: Expression | FormulaNode, right: Expression | FormulaNode):
         self.left = left
         self.right = right
+        self._smt = None
 
     def __str__(self):
         return f"({self.left}) == ({self.right})"
 
     def to_smt(self) -> Any:
-        return pysmt.Equals(self.left.to_smt(), self.right.to_smt())
+        smt = self._smt
+        if smt is None:
+            smt = self._smt = pysmt.Equals(self.left.to_smt(), self.right.to_smt())
+        return smt
 
     def used_vars(self) -> set[Variable]:
         return self.left.used_vars() | self.right.used_vars()
@@ -174,10 +254,11 @@ class Equals(FormulaNode):
     def substitute(
             self, mapping: dict[Variable, FormulaNode]
     ) -> FormulaNode:
-        return Equals(
-            self.left.substitute(mapping),
-            self.right.substitute(mapping),
-        )
+        left = self.left.substitute(mapping)
+        right = self.right.substitute(mapping)
+        if left is self.left and right is self.right:
+            return self
+        return Equals(left, right)
 
 
 class FormulaManager(ReprMixin):
@@ -209,6 +290,23 @@ class FormulaManager(ReprMixin):
         """
         return Variable(self.fresh_name(), size)
 
+    def fresh_variables(self, sizes: Sequence[int]) -> list[Variable]:
+        """
+        Create fresh variables with unique names, one for each of the given sizes.
+
+        The variables are named as if fresh_variable() was called for each size
+        in turn, but the name counter is only advanced once.
+
+        :param sizes: the sizes of the variables
+        :return: a list of Variable instances, in the order of the given sizes
+        """
+        step = 1 if self._count_up else -1
+        first = self._next_free_var_name
+        self._next_free_var_name += step * len(sizes)
+        return [
+            Variable(str(first + i * step), size) for i, size in enumerate(sizes)
+        ]
+
 
 class PureFormula(ReprMixin):
     def __init__(
@@ -5,4 +5,21 @@ Author: Jort van Leenen
 License: MIT (See LICENSE file or https://opensource.org/licenses/MIT for details)
 """
 
+import os
+from pathlib import Path
+
 logic_name = "QF_BV"
+
+ir_cache_dir = Path.home() / ".cache" / "octopus" / "ir"
+ir_cache_disable_env = "OCTOPUS_NO_CACHE"
+
+# The default socket of the daemon, in a per-user directory (rather than, e.g.,
+# /tmp, where other users could take its place)
+daemon_socket = str(
+    Path(os.environ.get("XDG_RUNTIME_DIR") or Path.home() / ".cache" / "octopus")
+    / "octopus.sock"
+)
+
+# The number of parser states (of both programs together) from which the
+# programs are built in parallel processes
+parallel_parse_min_states = 256
@@ -0,0 +1,127 @@
+"""
+This module defines a minimal daemon and its client, which allow many equivalence
+checks to be served by one long-running process over a Unix domain socket.
+
+Requests and responses are JSON objects, each sent as a single line.
+
+Author: Jort van Leenen
+License: MIT (See LICENSE file or https://opensource.org/licenses/MIT for details)
+"""
+
+import logging
+import os
+import socket
+import stat
+from typing import Callable
+
+from octopus.utils import dump_json, load_json
+
+logger = logging.getLogger(__name__)
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    """
+    Remove a socket left behind by a daemon that did not exit cleanly.
+
+    :param socket_path: the path of the Unix domain socket
+    :raises FileExistsError: if the path exists and is not a socket
+    :raises RuntimeError: if a daemon is still listening on the socket
+    """
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"'{socket_path}' exists and is not a socket")
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except ConnectionRefusedError:
+            logger.info("Removing stale socket '%s'", socket_path)
+            os.unlink(socket_path)
+            return
+    raise RuntimeError(f"An Octopus daemon is already listening on '{socket_path}'")
+
+
+def serve(socket_path: str, handler: Callable[[dict], dict]) -> None:
+    """
+    Serve requests on a Unix domain socket until interrupted.
+
+    Connections are handled one at a time. A connection may send any number of
+    requests, each of which is answered before the next one is read. An
+    exception raised by the handler is reported to the client as an error
+    response and does not stop the daemon.
+
+    The socket is only accessible to the user running the daemon, as any client
+    can request checks and receives their verdicts.
+
+    :param socket_path: the path of the Unix domain socket to listen on
+    :param handler: a function computing the response to a request
+    """
+    os.makedirs(os.path.dirname(socket_path) or ".", mode=0o700, exist_ok=True)
+    _remove_stale_socket(socket_path)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        # Create the socket with mode 0600, rather than restricting it afterwards
+        old_umask = os.umask(0o177)
+        try:
+            server.bind(socket_path)
+        finally:
+            os.umask(old_umask)
+        bound = os.lstat(socket_path)
+        server.listen()
+        logger.info("Listening on '%s'", socket_path)
+        try:
+            while True:
+                connection, _ = server.accept()
+                with connection, connection.makefile("rwb") as stream:
+                    for line in stream:
+                        try:
+                            response = handler(load_json(line))
+                        except Exception as e:
+                            logger.exception("Failed to handle request: %s", e)
+                            response = {"error": f"{type(e).__name__}: {e}"}
+                        stream.write(dump_json(response) + b"\n")
+                        stream.flush()
+        except KeyboardInterrupt:
+            logger.info("Daemon interrupted, shutting down")
+        finally:
+            # Only remove the socket if it was not replaced in the meantime
+            try:
+                current = os.lstat(socket_path)
+            except FileNotFoundError:
+                pass
+            else:
+                if (current.st_dev, current.st_ino) == (bound.st_dev, bound.st_ino):
+                    os.unlink(socket_path)
+
+
+def send_request(socket_path: str, request: dict) -> dict:
+    """
+    Send a request to a daemon and wait for its response.
+
+    :param socket_path: the path of the Unix domain socket the daemon listens on
+    :param request: the request to send
+    :return: the response of the daemon
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except OSError as e:
+            raise OSError(
+                f"Could not connect to an Octopus daemon at '{socket_path}': {e.strerror}"
+            ) from e
+
+        with client.makefile("rwb") as stream:
+            stream.write(dump_json(request) + b"\n")
+            stream.flush()
+            line = stream.readline()
+
+    if not line:
+        raise RuntimeError("The Octopus daemon closed the connection unexpectedly")
+
+    response = load_json(line)
+    if "error" in response:
+        raise RuntimeError(f"The Octopus daemon failed: {response['error']}")
+    return response
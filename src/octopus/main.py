@@ -7,27 +7,60 @@ License: MIT (See LICENSE file or https://opensource.org/licenses/MIT for detail
 
 import argparse
 import ast
+import contextlib
+import functools
+import hashlib
+import io
 import json
 import logging
+import multiprocessing
+import os
+import re
 import shutil
 import subprocess
 import sys
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 
-from pysmt.logics import get_logic_by_name
-from pysmt.shortcuts import Portfolio, get_env
-
-from bisimulation.bisimulation import symbolic_bisimulation
 from octopus import constants
 from octopus.__about__ import __version__
-from octopus.utils import setup_logging
-from program.parser_program import ParserProgram
+from octopus.daemon import send_request, serve
+from octopus.utils import dump_json, load_json, setup_logging
 
 logger = logging.getLogger(__name__)
 
 
+# PySMT, and the modules depending on it, are imported on first use, as
+# importing them is slow and not needed for, e.g., --help or --server
+
+
+@functools.cache
+def _get_logic() -> Any:
+    """
+    Get the PySMT logic that the solvers must support.
+
+    :return: the PySMT logic object
+    """
+    from pysmt.logics import get_logic_by_name
+
+    return get_logic_by_name(constants.logic_name)
+
+
+@functools.cache
+def _get_parsed_object_types() -> list[str]:
+    """
+    Get the node types of the top-level IR objects that a ParserProgram parses.
+
+    :return: the sorted list of node types
+    """
+    from program.parser_program import ParserProgram
+
+    return sorted(ParserProgram._OBJECT_HANDLERS)
+
+
 def parse_arguments() -> argparse.Namespace:
     """
     Parse the CLI arguments.
@@ -47,8 +80,12 @@ def parse_arguments() -> argparse.Namespace:
         action="store_true",
         help="specify that both inputs are in IR (p4c) JSON format",
     )
-    parser.add_argument("file1", metavar="file 1", help="path to the first P4 program")
-    parser.add_argument("file2", metavar="file 2", help="path to the second P4 program")
+    parser.add_argument(
+        "file1", metavar="file 1", nargs="?", help="path to the first P4 program"
+    )
+    parser.add_argument(
+        "file2", metavar="file 2", nargs="?", help="path to the second P4 program"
+    )
     parser.add_argument(
         "-v",
         "--verbosity",
@@ -78,6 +115,11 @@ def parse_arguments() -> argparse.Namespace:
         action="store_true",
         help="do not validate correctness of the certificate (if found bisimilar)"
     )
+    parser.add_argument(
+        "--subsumption",
+        action="store_true",
+        help="drop known guarded formulas that are subsumed by newly found ones",
+    )
     parser.add_argument(
         "-f",
         "--fail-on-mismatch",
@@ -88,14 +130,15 @@ def parse_arguments() -> argparse.Namespace:
         "-s",
         "--solvers",
         type=str,
-        default="['z3']",
-        help="list of solvers, possibly with options, to use for bisimulation",
+        default='["z3"]',
+        help="JSON list of solvers, possibly with options, to use for bisimulation "
+        '(e.g., \'["z3", ["cvc5", {"option": "value"}]]\')',
     )
     parser.add_argument(
         "--solvers-global-options",
         type=str,
         metavar="GLOBAL_OPTIONS",
-        help="global options for the provided solvers",
+        help="JSON object of global options for the provided solvers",
     )
     parser.add_argument(
         "--filter-accepting-string",
@@ -117,7 +160,33 @@ def parse_arguments() -> argparse.Namespace:
         type=str,
         help="define a filter for disagreeing pairs via a file",
     )
-    return parser.parse_args()
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--daemon",
+        action="store_true",
+        help="serve equivalence checks on a Unix domain socket",
+    )
+    mode.add_argument(
+        "--server",
+        action="store_true",
+        help="perform the equivalence check using a running daemon",
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=constants.daemon_socket,
+        metavar="PATH",
+        help="the Unix domain socket of the daemon, for --daemon and --server "
+        f"(default: {constants.daemon_socket})",
+    )
+
+    args = parser.parse_args()
+    if args.daemon:
+        if args.file1 is not None or args.file2 is not None:
+            parser.error("argument --daemon: not allowed with file arguments")
+    elif args.file1 is None or args.file2 is None:
+        parser.error("the following arguments are required: file 1, file 2")
+    return args
 
 
 def parse_filters(args: argparse.Namespace) -> tuple[str | None, str | None]:
@@ -135,21 +204,23 @@ def parse_filters(args: argparse.Namespace) -> tuple[str | None, str | None]:
             )
 
         if filter_string is not None:
-            logger.info(f"Using {kind} filter from string: {filter_string}")
+            logger.info("Using %s filter from string: %s", kind, filter_string)
             return filter_string
 
         if filter_file is not None:
             try:
                 with open(filter_file, "r", encoding="utf-8") as f:
                     filter_str = f.read()
-                logger.info(f"Using {kind} filter from file '{filter_file}': {filter_str}")
+                logger.info(
+                    "Using %s filter from file '%s': %s", kind, filter_file, filter_str
+                )
                 return filter_str
             except OSError as e:
                 raise OSError(
                     f"Error opening {kind} filter file '{filter_file}': {e.strerror}"
                 ) from e
 
-        logger.info(f"No {kind} filter provided.")
+        logger.info("No %s filter provided.", kind)
         return None
 
     filter_accepting = _load_filter(
@@ -167,74 +238,426 @@ def parse_filters(args: argparse.Namespace) -> tuple[str | None, str | None]:
     return filter_accepting, filter_disagreeing
 
 
-def create_portfolio(args: argparse.Namespace):
+def _parse_literal(value: str) -> Any:
     """
-    Given a list of wanted solvers, return a portfolio of available solvers.
+    Parse a JSON document, or a Python literal for backwards compatibility.
+
+    :param value: the string to parse
+    :return: the parsed value
+    """
+    try:
+        return load_json(value)
+    except json.JSONDecodeError:
+        return ast.literal_eval(value)
+
+
+def select_solvers(args: argparse.Namespace) -> tuple[list, dict]:
+    """
+    Given a list of wanted solvers, return those that are available.
 
     :param args: the parsed command-line arguments
-    :return: a Portfolio object containing the available solvers
+    :return: the available solvers (with their options), and the global options
     """
+    from pysmt.shortcuts import get_env
+
     try:
-        solvers = ast.literal_eval(args.solvers)
+        solvers = _parse_literal(args.solvers)
     except (SyntaxError, ValueError) as e:
         raise ValueError(
             f"Invalid solvers format: {args.solvers}. "
-            "Expected a list of solvers, e.g., ['z3', ('cvc5', {'option': 'value'})]."
+            'Expected a list of solvers, e.g., ["z3", ["cvc5", {"option": "value"}]].'
         ) from e
+    if isinstance(solvers, list):
+        # JSON has no tuples, so a (name, options) pair arrives as a list
+        solvers = [
+            tuple(solver) if isinstance(solver, list) else solver
+            for solver in solvers
+        ]
 
     options = {}
     if args.solvers_global_options:
         try:
-            options = ast.literal_eval(args.solvers_global_options)
+            options = _parse_literal(args.solvers_global_options)
+            if not isinstance(options, dict):
+                raise ValueError("Solvers global options are not a dictionary")
         except (SyntaxError, ValueError) as e:
             raise ValueError(
                 f"Invalid solvers global options format: {args.solvers_global_options}. "
-                "Expected a dictionary, e.g., {'option': 'value'}"
+                'Expected a dictionary, e.g., {"option": "value"}'
             ) from e
 
     available_solvers: list[str] = list(
-        get_env()
-        .factory.all_solvers(logic=get_logic_by_name(constants.logic_name))
-        .keys()
+        get_env().factory.all_solvers(logic=_get_logic()).keys()
     )
-    logger.info(f"Available solvers: {available_solvers}")
+    logger.info("Available solvers: %s", available_solvers)
+    available = frozenset(available_solvers)
 
     selected_solvers = []
+    unavailable = []
     for solver in solvers:
         if isinstance(solver, str):
-            if solver in available_solvers:
-                selected_solvers.append(solver)
-            else:
-                logger.warning(f"Solver '{solver}' is not available.")
+            name = solver
         elif isinstance(solver, tuple) and len(solver) == 2:
-            name, opts = solver
-            if name in available_solvers:
-                selected_solvers.append((name, opts))
-            else:
-                logger.warning(f"Solver '{name}' is not available.")
+            name = solver[0]
         else:
             logger.error(
-                f"Invalid solver format: {solver}. "
-                "Expected a string or a tuple (name, options)."
+                "Invalid solver format: %s. "
+                "Expected a string or a tuple (name, options).",
+                solver,
             )
+            continue
+
+        if name in available:
+            selected_solvers.append(solver)
+        else:
+            unavailable.append(name)
+
+    if unavailable:
+        logger.warning("Solver(s) not available: %s", ", ".join(unavailable))
     if not selected_solvers:
         raise ValueError(
             "None of the specified solvers are available. "
             "Available solvers: " + ", ".join(available_solvers)
         )
-    logger.info(f"Selected solvers: {selected_solvers}")
+    logger.info("Selected solvers: %s", selected_solvers)
+
+    # The bisimulation issues many queries to one portfolio, which pysmt only
+    # permits (via push/pop around each query) for incremental solvers
+    if not options.get("incremental", True):
+        logger.warning("Ignoring 'incremental': False, as it is required")
+    options["incremental"] = True
+
+    return selected_solvers, options
+
+
+def create_portfolio(args: argparse.Namespace):
+    """
+    Given a list of wanted solvers, return a portfolio of available solvers.
+
+    :param args: the parsed command-line arguments
+    :return: a Portfolio object containing the available solvers
+    """
+    from pysmt.shortcuts import Portfolio
+
+    selected_solvers, options = select_solvers(args)
+    return Portfolio(selected_solvers, _get_logic(), **options)
+
+
+def _load_json_file(path: str | Path) -> dict:
+    """
+    Load a JSON file, using orjson when it is installed.
+
+    :param path: the path to the JSON file
+    :return: the decoded JSON object
+    """
+    with open(path, "rb") as f:
+        return load_json(f.read())
+
+
+@functools.cache
+def _get_p4c_graphs_version() -> str:
+    """
+    Get the version string reported by p4c-graphs.
+
+    :return: the output of 'p4c-graphs --version'
+    """
+    result = subprocess.run(
+        ["p4c-graphs", "--version"], capture_output=True, text=True, check=True
+    )
+    return result.stdout
+
+
+# An #include directive, naming a file in quotes or angle brackets. Any other
+# form (e.g., a macro expanding to a file name) is captured as a whole.
+_INCLUDE_RE = re.compile(
+    rb'^[ \t]*#[ \t]*include[ \t]*(?:"([^"\n]*)"|<([^>\n]*)>|(.*))', re.M
+)
+
+
+def _hash_p4_sources(file: str, digest: Any) -> bool:
+    """
+    Feed a P4 file, and the files it (transitively) includes, into a hash.
+
+    Files included with quotes are looked up next to the including file, like
+    the preprocessor of p4c does. Files that are not found there, and files
+    included with angle brackets, come from the p4c installation, which is
+    covered by its version. Directives are matched textually, so an include in,
+    e.g., a comment only makes the key more specific.
+
+    :param file: the path to the P4 file
+    :param digest: the hash object to update
+    :return: whether all includes could be resolved without preprocessing
+    """
+    with open(file, "rb") as f:
+        source = f.read()
+    digest.update(source)
+
+    visited = {os.path.realpath(file)}
+    stack = [(os.path.dirname(file), source)]
+    while stack:
+        directory, source = stack.pop()
+        for match in _INCLUDE_RE.finditer(source):
+            quoted, bracketed, other = match.groups()
+            if other is not None:
+                return False
+
+            name = quoted if quoted is not None else bracketed
+            digest.update(b"\0include\0" + name + b"\0")
+            if quoted is None:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if not os.path.isfile(path):
+                continue
+            real_path = os.path.realpath(path)
+            if real_path in visited:
+                continue
+            visited.add(real_path)
+
+            try:
+                with open(path, "rb") as f:
+                    included = f.read()
+            except OSError:
+                return False
+            digest.update(included)
+            stack.append((os.path.dirname(path), included))
+    return True
+
+
+def _get_ir_cache_path(file: str) -> Path | None:
+    """
+    Get the path at which the IR JSON of a P4 file is cached.
+
+    The cache is content-addressed: the key is the SHA-256 hash of the P4 source,
+    the files it includes, the p4c-graphs version and the IR objects that are
+    kept by _prune_ir(), so that a change to any of
+    these results in a cache miss. Caching is disabled by setting
+    OCTOPUS_NO_CACHE=1, and is skipped for files whose includes cannot be
+    resolved or when the p4c-graphs version cannot be determined.
+
+    :param file: the path to the P4 file
+    :return: the path of the cache entry, or None if the file is not cached
+    """
+    if os.environ.get(constants.ir_cache_disable_env) == "1":
+        return None
+
+    digest = hashlib.sha256()
+    try:
+        resolved = _hash_p4_sources(file, digest)
+    except OSError as e:
+        raise OSError(f"Error opening file '{file}': {e.strerror}") from e
+    if not resolved:
+        logger.info(
+            "Not caching the IR JSON of '%s', as an include cannot be resolved", file
+        )
+        return None
+
+    try:
+        version = _get_p4c_graphs_version()
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(
+            "Not caching IR JSON, as the p4c-graphs version is unknown: %s", e
+        )
+        return None
+    digest.update(version.encode())
+    # The cached IR is pruned to the objects that are parsed (see _prune_ir())
+    digest.update("\0".join(_get_parsed_object_types()).encode())
+
+    return constants.ir_cache_dir / f"{digest.hexdigest()}.json"
+
+
+def _store_ir_cache(ir_json: dict, cache_path: Path) -> None:
+    """
+    Atomically store IR JSON in the cache.
+
+    Failing to write the cache is not fatal, as it only affects later runs.
+
+    :param ir_json: the (pruned) IR JSON of a P4 file
+    :param cache_path: the path of the cache entry
+    """
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                dir=cache_path.parent, suffix=".tmp", delete=False
+        ) as temp_file:
+            temp_file.write(dump_json(ir_json))
+        os.replace(temp_file.name, cache_path)
+        logger.info("Cached IR JSON at '%s'", cache_path)
+    except OSError as e:
+        logger.warning("Could not write IR cache entry '%s': %s", cache_path, e)
+
+
+# Whether p4c-graphs can write its IR JSON to stdout, which avoids a round-trip
+# through a temporary file. None until the first P4 file has been converted,
+# after which it is set once (under the lock, as files are converted in threads).
+_json_to_stdout: bool | None = None if os.path.exists("/dev/stdout") else False
+_json_to_stdout_lock = threading.Lock()
+
+
+def _set_json_to_stdout(supported: bool) -> None:
+    """
+    Record whether p4c-graphs can write its IR JSON to stdout, unless known.
+
+    :param supported: whether writing to stdout worked
+    """
+    global _json_to_stdout
+
+    with _json_to_stdout_lock:
+        if _json_to_stdout is None:
+            _json_to_stdout = supported
+
 
-    portfolio = Portfolio(
-        selected_solvers, get_logic_by_name(constants.logic_name), **options
+def _run_p4c_graphs_to_stdout(file: str, temp_dir: str) -> dict | None:
+    """
+    Convert a P4 file to IR JSON using p4c-graphs, reading the JSON from stdout.
+
+    :param file: the path to the P4 file
+    :param temp_dir: the directory to write the graphs of p4c-graphs to
+    :return: the decoded IR JSON, or None if p4c-graphs cannot write to stdout
+    """
+    result = subprocess.run(
+        ["p4c-graphs", "--toJSON", "/dev/stdout", "--graphs-dir", temp_dir, file],
+        capture_output=True,
     )
+    if result.returncode != 0:
+        stderr = result.stderr.decode(errors="replace")
+        if "/dev/stdout" in stderr:
+            return None
+        raise subprocess.CalledProcessError(
+            result.returncode,
+            result.args,
+            result.stdout.decode(errors="replace"),
+            stderr,
+        )
+
+    try:
+        return load_json(result.stdout)
+    except json.JSONDecodeError:
+        return None
+
+
+def _run_p4c_graphs(file: str) -> dict:
+    """
+    Convert a P4 file to IR JSON using p4c-graphs.
+
+    :param file: the path to the P4 file
+    :return: the decoded IR JSON as produced by p4c-graphs
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if _json_to_stdout is not False:
+            ir_json = _run_p4c_graphs_to_stdout(file, temp_dir)
+            if ir_json is not None:
+                _set_json_to_stdout(True)
+                return ir_json
+            logger.info(
+                "p4c-graphs did not write valid IR JSON to stdout, "
+                "retrying with a temporary file"
+            )
+
+        temp_json_file = Path(temp_dir) / "IR.json"
+        subprocess.run(
+            [
+                "p4c-graphs",
+                "--toJSON",
+                temp_json_file,
+                "--graphs-dir",
+                temp_dir,
+                file,
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        # Only give up on stdout once the temporary file is known to work
+        _set_json_to_stdout(False)
+        return _load_json_file(temp_json_file)
+
+
+def _prune_ir(ir_json: dict) -> dict:
+    """
+    Drop the top-level IR objects that a ParserProgram does not parse.
+
+    Most of the IR that p4c-graphs produces describes, e.g., controls and
+    externs. Dropping these keeps them out of memory and out of the IR cache,
+    which is then faster to load.
+
+    :param ir_json: the IR JSON as produced by p4c-graphs
+    :return: the IR JSON containing only the objects relevant to the parser
+    """
+    objects = ir_json.get("objects")
+    if not isinstance(objects, dict) or "vec" not in objects:
+        # Leave malformed IR to be reported by ParserProgram
+        return ir_json
 
-    return portfolio
+    types = _get_parsed_object_types()
+
+    return {
+        "objects": {
+            "vec": [
+                obj
+                for obj in objects["vec"]
+                if obj.get("Node_Type") in types
+            ]
+        }
+    }
+
+
+def _read_p4_file(file: str, in_json: bool) -> dict:
+    """
+    Read a single (IR) P4 file and return its parsed JSON representation.
+
+    :param file: the path to the P4 file to read
+    :param in_json: whether the file is already in IR JSON format
+    :return: the parsed JSON representation of the file
+    """
+    if in_json:
+        try:
+            return _load_json_file(file)
+        except OSError as e:
+            raise OSError(f"Error opening file '{file}': {e.strerror}") from e
+        except json.JSONDecodeError as e:
+            raise ValueError(
+                f"Invalid JSON in '{file}' at line {e.lineno} column {e.colno}: {e.msg}"
+            ) from e
+
+    cache_path = _get_ir_cache_path(file)
+    if cache_path is not None and cache_path.is_file():
+        try:
+            ir_json = _load_json_file(cache_path)
+            logger.info("Loaded IR JSON of '%s' from cache", file)
+            return ir_json
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Ignoring unusable IR cache entry '%s': %s", cache_path, e)
+
+    try:
+        ir_json = _prune_ir(_run_p4c_graphs(file))
+        logger.info("Converted '%s' to IR JSON format", file)
+
+        if cache_path is not None:
+            _store_ir_cache(ir_json, cache_path)
+
+        return ir_json
+    except subprocess.CalledProcessError as e:
+        logger.error(
+            "p4c-graphs failed, it reported:\n  stdout: %s\n  stderr: %s",
+            e.stdout,
+            e.stderr,
+        )
+        raise RuntimeError(
+            f"p4c-graphs failed with exit code {e.returncode}"
+        ) from e
+    except json.JSONDecodeError as e:
+        raise ValueError(
+            f"Invalid JSON output from p4c-graphs at line {e.lineno}, column {e.colno}: {e.msg}"
+        ) from e
 
 
 def read_p4_files(files: list[str], in_json: bool) -> list[dict]:
     """
     Read the provided (IR) P4 files and return their parsed JSON representations.
 
+    The files are read concurrently, as the p4c-graphs invocations are
+    independent and mostly spent waiting on a subprocess.
+
     :param files: a list of file paths to the P4 files to read
     :param in_json: whether the files are already in IR JSON format
     :return: a list containing the parsed JSON representations of the files
@@ -245,56 +668,199 @@ def read_p4_files(files: list[str], in_json: bool) -> list[dict]:
             "Please ensure it is installed and available in your system PATH"
         )
 
-    jsons = []
-    for file in files:
-        if in_json:
-            try:
-                with open(file, encoding="utf-8") as f:
-                    jsons.append(json.load(f))
-            except OSError as e:
-                raise OSError(f"Error opening file '{file}': {e.strerror}") from e
-            except json.JSONDecodeError as e:
-                raise ValueError(
-                    f"Invalid JSON in '{file}' at line {e.lineno} column {e.colno}: {e.msg}"
-                ) from e
-        else:
-            try:
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    temp_json_file = Path(temp_dir) / "IR.json"
-
-                    subprocess.run(
-                        [
-                            "p4c-graphs",
-                            "--toJSON",
-                            temp_json_file,
-                            "--graphs-dir",
-                            temp_dir,
-                            file,
-                        ],
-                        capture_output=True,
-                        text=True,
-                        check=True,
-                    )
-                    logger.info(f"Converted '{file}' to IR JSON format")
-
-                    with open(temp_json_file, "r", encoding="utf-8") as f:
-                        jsons.append(json.load(f))
-
-            except subprocess.CalledProcessError as e:
-                logger.error(
-                    f"p4c-graphs failed, it reported:\n"
-                    f"  stdout: {e.stdout}\n"
-                    f"  stderr: {e.stderr}"
-                )
-                raise RuntimeError(
-                    f"p4c-graphs failed with exit code {e.returncode}"
-                ) from e
-            except json.JSONDecodeError as e:
-                raise ValueError(
-                    f"Invalid JSON output from p4c-graphs at line {e.lineno}, column {e.colno}: {e.msg}"
-                ) from e
+    if len(files) <= 1:
+        return [_read_p4_file(file, in_json) for file in files]
 
-    return jsons
+    with ThreadPoolExecutor(max_workers=len(files)) as executor:
+        return list(executor.map(lambda file: _read_p4_file(file, in_json), files))
+
+
+def _build_parser(ir_json: dict, is_left: bool) -> Any:
+    """
+    Build a ParserProgram from IR JSON.
+
+    :param ir_json: the IR JSON of the P4 program
+    :param is_left: whether this is the left parser program
+    :return: the ParserProgram object
+    """
+    from program.parser_program import ParserProgram
+
+    return ParserProgram(ir_json, is_left)
+
+
+def _count_parser_states(ir_json: dict) -> int:
+    """
+    Count the parser states in IR JSON, as a measure of the work to parse it.
+
+    :param ir_json: the IR JSON of a P4 program
+    :return: the number of parser states in the IR JSON
+    """
+    return sum(
+        len(obj["states"]["vec"])
+        for obj in ir_json.get("objects", {}).get("vec", [])
+        if obj.get("Node_Type") == "P4Parser"
+    )
+
+
+def build_parsers(ir_jsons: list[dict]) -> list[Any]:
+    """
+    Build the ParserProgram objects for the given IR JSONs.
+
+    Large programs are built in parallel processes, as building them is
+    CPU-bound. Forked processes inherit the imported modules, so this is only
+    done where forking is available. Small programs are built sequentially,
+    as the cost of transferring the result would outweigh the gain.
+
+    :param ir_jsons: the IR JSONs of the P4 programs, the left one first
+    :return: the ParserProgram objects, in the same order
+    """
+    jobs = [(ir_json, i == 0) for i, ir_json in enumerate(ir_jsons)]
+    total_states = sum(_count_parser_states(ir_json) for ir_json in ir_jsons)
+    if (
+            len(jobs) <= 1
+            or total_states < constants.parallel_parse_min_states
+            or "fork" not in multiprocessing.get_all_start_methods()
+    ):
+        return [_build_parser(*job) for job in jobs]
+
+    logger.info(
+        "Building %d parsers in parallel (%d states)", len(jobs), total_states
+    )
+    with multiprocessing.get_context("fork").Pool(len(jobs)) as pool:
+        return pool.starmap(_build_parser, jobs)
+
+
+def run_check(
+        args: argparse.Namespace,
+        portfolio: Any,
+        filter_accepting: str | None,
+        filter_disagreeing: str | None,
+) -> tuple[bool, str]:
+    """
+    Check the equivalence of the two P4 parsers given in the arguments.
+
+    :param args: the parsed command-line arguments
+    :param portfolio: the solver portfolio to use for the bisimulation
+    :param filter_accepting: an optional filter for accepting pairs
+    :param filter_disagreeing: an optional filter for disagreeing pairs
+    :return: a boolean indicating equivalence, and a certificate or counterexample
+    """
+    from bisimulation.bisimulation import symbolic_bisimulation
+
+    logger.info("Reading P4 files...")
+    ir_jsons = read_p4_files([args.file1, args.file2], args.json)
+    if not args.json:
+        logger.info("Converted both P4 files to IR JSON format")
+        logger.debug("IR JSON of file 1:\n%s", ir_jsons[0])
+        logger.debug("IR JSON of file 2:\n%s", ir_jsons[1])
+
+    # Identical parsers are trivially bisimilar, unless an accepting filter
+    # imposes an additional constraint on the (equal) accepted headers
+    if filter_accepting is None and ir_jsons[0] == ir_jsons[1]:
+        logger.info("Both inputs have identical IR JSON, skipping bisimulation")
+        are_equal = True
+        certificate = "Both parsers have identical IR JSON (identity relation)."
+    else:
+        logger.info("Creating Parser objects...")
+        parsers = build_parsers(ir_jsons)
+        logger.info("Created Parser objects")
+        # Rendering full parser programs is expensive, so skip it unless needed
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Parser object 1 (repr):\n%r", parsers[0])
+            logger.debug("Parser object 1 (str):\n%s", parsers[0])
+            logger.debug("Parser object 2 (repr):\n%r", parsers[1])
+            logger.debug("Parser object 2 (str)\n%s", parsers[1])
+
+        are_equal, certificate = symbolic_bisimulation(
+            parsers[0],
+            parsers[1],
+            filter_accepting=filter_accepting,
+            filter_disagreeing=filter_disagreeing,
+            solver_portfolio=portfolio,
+            validate_certificate=not args.no_validation,
+            to_time=args.time,
+            enable_subsumption=getattr(args, "subsumption", False),
+        )
+
+    return are_equal, certificate
+
+
+def run_daemon(args: argparse.Namespace) -> None:
+    """
+    Serve equivalence checks from a long-running process.
+
+    The solver selection, and the import and initialisation of PySMT, are done
+    once at startup instead of once per check. Each request is a JSON object
+    with the keys 'file1', 'file2', 'json', 'no_validation', 'subsumption',
+    'time', 'filter_accepting' and 'filter_disagreeing'. Each response holds the
+    keys 'are_equal', 'certificate' and 'output', the latter being anything the
+    check printed.
+
+    :param args: the parsed command-line arguments
+    """
+    from pysmt.shortcuts import Portfolio
+
+    selected_solvers, options = select_solvers(args)
+
+    def _handle(request: dict) -> dict:
+        check_args = argparse.Namespace(
+            file1=request["file1"],
+            file2=request["file2"],
+            json=request.get("json", False),
+            no_validation=request.get("no_validation", False),
+            time=request.get("time", False),
+            subsumption=request.get("subsumption", False),
+        )
+        # A portfolio cannot be reused once it has been exited
+        portfolio = Portfolio(selected_solvers, _get_logic(), **options)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            are_equal, certificate = run_check(
+                check_args,
+                portfolio,
+                request.get("filter_accepting"),
+                request.get("filter_disagreeing"),
+            )
+        return {
+            "are_equal": are_equal,
+            "certificate": certificate,
+            "output": output.getvalue(),
+        }
+
+    serve(args.socket, _handle)
+
+
+def request_check(
+        args: argparse.Namespace,
+        filter_accepting: str | None,
+        filter_disagreeing: str | None,
+) -> tuple[bool, str]:
+    """
+    Check the equivalence of the two P4 parsers using a running daemon.
+
+    The daemon uses the solvers it was started with.
+
+    :param args: the parsed command-line arguments
+    :param filter_accepting: an optional filter for accepting pairs
+    :param filter_disagreeing: an optional filter for disagreeing pairs
+    :return: a boolean indicating equivalence, and a certificate or counterexample
+    """
+    response = send_request(
+        args.socket,
+        {
+            # The daemon does not share the working directory of the client
+            "file1": os.path.abspath(args.file1),
+            "file2": os.path.abspath(args.file2),
+            "json": args.json,
+            "no_validation": args.no_validation,
+            "subsumption": args.subsumption,
+            "time": args.time,
+            "filter_accepting": filter_accepting,
+            "filter_disagreeing": filter_disagreeing,
+        },
+    )
+    print(response["output"], end="")
+    return response["are_equal"], response["certificate"]
 
 
 def main(args: Any = None) -> None:
@@ -304,39 +870,26 @@ def main(args: Any = None) -> None:
     if args is None:
         args = parse_arguments()
         setup_logging(args.verbosity)
-        logger.debug(f"Parsed CLI argument values: {args}")
+        logger.debug("Parsed CLI argument values: %s", args)
     else:
-        logger.debug(f"Received the following arguments: {args}")
+        logger.debug("Received the following arguments: %s", args)
 
     sys.setrecursionlimit(10000)  # Required for larger parsers
 
-    portfolio = create_portfolio(args)
-    filter_accepting, filter_disagreeing = parse_filters(args)
+    if getattr(args, "daemon", False):
+        run_daemon(args)
+        return
 
-    logger.info("Reading P4 files...")
-    ir_jsons = read_p4_files([args.file1, args.file2], args.json)
-    if not args.json:
-        logger.info("Converted both P4 files to IR JSON format")
-        logger.debug(f"IR JSON of file 1:\n{ir_jsons[0]}")
-        logger.debug(f"IR JSON of file 2:\n{ir_jsons[1]}")
-
-    logger.info("Creating Parser objects...")
-    parsers = [ParserProgram(j, i == 0) for i, j in enumerate(ir_jsons)]
-    logger.info("Created Parser objects")
-    logger.debug(f"Parser object 1 (repr):\n{parsers[0]!r}")
-    logger.debug(f"Parser object 1 (str):\n{parsers[0]}")
-    logger.debug(f"Parser object 2 (repr):\n{parsers[1]!r}")
-    logger.debug(f"Parser object 2 (str)\n{parsers[1]}")
-
-    are_equal, certificate = symbolic_bisimulation(
-        parsers[0],
-        parsers[1],
-        filter_accepting=filter_accepting,
-        filter_disagreeing=filter_disagreeing,
-        solver_portfolio=portfolio,
-        validate_certificate=not args.no_validation,
-        to_time=args.time
-    )
+    filter_accepting, filter_disagreeing = parse_filters(args)
+    if getattr(args, "server", False):
+        are_equal, certificate = request_check(
+            args, filter_accepting, filter_disagreeing
+        )
+    else:
+        portfolio = create_portfolio(args)
+        are_equal, certificate = run_check(
+            args, portfolio, filter_accepting, filter_disagreeing
+        )
 
     if are_equal:
         message = "The two parsers are equivalent."
@@ -350,14 +903,15 @@ def main(args: Any = None) -> None:
     if args.output:
         try:
             with open(args.output, "w", encoding="utf-8") as f:
-                f.write(f"{message}\n{header}\n{certificate}")
+                # Avoid copying a (potentially large) certificate into a new string
+                f.writelines((f"{message}\n{header}\n", certificate))
         except OSError as e:
             logger.error(
-                f"Could not write to output file '{args.output}': {e.strerror}"
+                "Could not write to output file '%s': %s", args.output, e.strerror
             )
             sys.exit(1)
     else:
-        print(f"{header}\n{certificate}")
+        print(header, certificate, sep="\n")
 
     if args.fail_on_mismatch and not are_equal:
         sys.exit(1)
@@ -367,5 +921,5 @@ if __name__ == "__main__":
     try:
         main()
     except Exception as e:
-        logger.exception(f"An unexpected error occurred:\n{e}")
+        logger.exception("An unexpected error occurred:\n%s", e)
         sys.exit(1)
@@ -5,19 +5,54 @@ Author: Jort van Leenen
 License: MIT (See LICENSE file or https://opensource.org/licenses/MIT for details)
 """
 
+import json
 import logging
+import reprlib
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional dependency
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# Bound the size of attribute representations, as some objects (e.g., the
+# headers and states of a parser program) can be arbitrarily large
+_attribute_repr = reprlib.Repr()
+_attribute_repr.maxstring = 200
+_attribute_repr.maxother = 200
+
 
 class ReprMixin:
     """A base class for objects that automatically generates a representation string."""
 
+    __slots__ = ()
+
+    def _repr_items(self) -> dict:
+        """
+        Get the attributes of this object, whether stored in slots or a __dict__.
+
+        :return: a dictionary mapping attribute names to their values
+        """
+        items = {}
+        for klass in reversed(type(self).__mro__):
+            for name in klass.__dict__.get("__slots__", ()):
+                if hasattr(self, name):
+                    items[name] = getattr(self, name)
+        items.update(getattr(self, "__dict__", {}))
+        return items
+
+    @reprlib.recursive_repr()
     def __repr__(self):
         cls = self.__class__.__name__
-        str_filter = ["_program", "program"]
-        filtered_items = {k: v for k, v in self.__dict__.items() if k not in str_filter}
-        args = ", ".join(f"{k!r}={v!r}" for k, v in filtered_items.items())
+        str_filter = ["_program", "program", "_hash", "_smt"]
+        filtered_items = {
+            k: v for k, v in self._repr_items().items() if k not in str_filter
+        }
+        args = ", ".join(
+            f"{k!r}={_attribute_repr.repr(v)}" for k, v in filtered_items.items()
+        )
         return f"{cls}({args})"
 
 
@@ -38,3 +73,30 @@ def setup_logging(verbosity: int) -> None:
         )
     else:
         root_logger.setLevel(level)
+
+
+def load_json(data: bytes | str) -> Any:
+    """
+    Decode a JSON document, using orjson when it is installed.
+
+    orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can handle
+    decoding errors identically regardless of the decoder in use.
+
+    :param data: the encoded JSON document
+    :return: the decoded JSON value
+    """
+    if orjson is None:
+        return json.loads(data)
+    return orjson.loads(data)
+
+
+def dump_json(obj: Any) -> bytes:
+    """
+    Encode a value as a compact JSON document, using orjson when it is installed.
+
+    :param obj: the value to encode
+    :return: the encoded JSON document
+    """
+    if orjson is None:
+        return json.dumps(obj, separators=(",", ":")).encode()
+    return orjson.dumps(obj)
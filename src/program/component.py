@@ -8,6 +8,7 @@ License: MIT (See LICENSE file or https://opensource.org/licenses/MIT for detail
 from __future__ import annotations
 
 import logging
+import sys
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING, Callable
 
@@ -36,6 +37,8 @@ logger = logging.getLogger(__name__)
 class Component(ABC):
     """A class representing an executable component of a P4 parser state's operation block."""
 
+    __slots__ = ()
+
     @abstractmethod
     def parse(self, component: dict) -> None:
         """
@@ -61,48 +64,65 @@ class Component(ABC):
 
 
 class Assignment(Component):
+    __slots__ = (
+        "_program",
+        "left",
+        "right",
+        "_target",
+        "_right_vars",
+        "_right_uses_target",
+    )
+
     def __init__(self, program: ParserProgram, component: dict = None):
         self._program: ParserProgram = program
         self.left: Slice | Reference | None = None
         self.right: Expression | None = None
+        self._target: Variable | None = None
+        self._right_vars: frozenset[Variable] = frozenset()
+        self._right_uses_target: bool = False
         if component is not None:
             self.parse(component)
 
     def parse(self, component: dict) -> None:
-        left = parse_expression(self._program, component["left"])
+        program = self._program
+        left = parse_expression(program, component["left"])
         if not isinstance(left, (Slice, Reference)):
             raise ValueError(
                 "Assignment left-hand side must be a Slice or Reference, "
                 f"but got {type(left).__name__}"
             )
         self.left = left
-        self.right = parse_expression(self._program, component["right"], len(left))
+        # The variable that is assigned to, left-hand slices are not yet supported
+        self._target = left.reference if isinstance(left, Reference) else None
+        self.right = parse_expression(program, component["right"], len(left))
+        # The variables of the right-hand side that remain after substituting the
+        # target, which is replaced by a fresh variable on execution
+        right_vars = self.right.used_vars()
+        self._right_vars = frozenset(right_vars - {self._target})
+        # Without the target, the right-hand side is the same after substitution
+        self._right_uses_target = self._target in right_vars
 
     def strongest_postcondition(
             self, manager: FormulaManager, pf: PureFormula, buf_size: int
     ) -> tuple[PureFormula, int]:
-        if isinstance(self.left, Slice):
+        target = self._target
+        if target is None:
             raise NotImplementedError(
                 "Assignment with left-hand slice is not yet supported"
             )
-            # reference = self.left.reference.reference
-        elif isinstance(self.left, Reference):
-            reference = self.left
-        else:
-            raise ValueError(
-                "Assignment left-hand side must be a Slice or Reference, "
-                f"but got {type(self.left).__name__}"
-            )
 
-        fresh_var = manager.fresh_variable(len(reference))
-        right_subst = self.right.substitute({reference.reference: fresh_var})
+        fresh_var = manager.fresh_variable(len(target))
+        substitution = {target: fresh_var}
+        right = self.right
+        if self._right_uses_target:
+            right = right.substitute(substitution)
 
         return PureFormula(
             And(
-                pf.root.substitute({reference.reference: fresh_var}),
-                Equals(reference.reference, right_subst)
+                pf.root.substitute(substitution),
+                Equals(target, right)
             ),
-            pf.used_vars | right_subst.used_vars() | {fresh_var},
+            pf.used_vars | self._right_vars | {fresh_var},
             pf.stream_var,
         ), buf_size
 
@@ -116,30 +136,49 @@ class Assignment(Component):
 class Extract(Component):
     """A class representing an extract method call in a P4 parser state."""
 
+    __slots__ = (
+        "_program",
+        "header_reference",
+        "header_content",
+        "size",
+        "_field_vars",
+        "_field_sizes",
+        "_fields_expr",
+    )
+
     def __init__(self, program: ParserProgram, call: dict = None):
         self._program: ParserProgram = program
         self.header_reference: str | None = None
         self.header_content: dict[str, int] | None = None
         self.size: int | None = None
+        self._field_vars: tuple[Variable, ...] = ()
+        self._field_sizes: tuple[int, ...] = ()
+        self._fields_expr: Variable | Concatenate | None = None
         if call is not None:
             self.parse(call)
 
     def parse(self, call: dict) -> None:
-        header_name = call["arguments"]["vec"][0]["expression"]["member"]
-        self.header_reference = self._program.output_name + "." + header_name
-        self.header_content: dict = self._program.get_header(self.header_reference)
-
-        sizes = []
-        for val in self.header_content.values():
-            if isinstance(val, int):
-                sizes.append(val)
+        program = self._program
+        first_argument = call["arguments"]["vec"][0]
+        header_name = first_argument["expression"]["member"]
+        # Intern the reference, as it prefixes the names of many header variables
+        self.header_reference = sys.intern(program.output_name + "." + header_name)
+        self.header_content = program.get_header(self.header_reference)
+
+        # The header variable and size of every field, in extraction order
+        fields = program.get_header_fields(self.header_reference)
+        if fields:
+            self._field_vars, self._field_sizes = zip(*fields)
+        self.size = sum(self._field_sizes)
+        # The extracted bits are always the same concatenation of the fields (the
+        # first field ending up in the least significant bits), so build it once
+        fields_expr = None
+        for field_var in self._field_vars:
+            if fields_expr is None:
+                fields_expr = field_var
             else:
-                try:
-                    sizes.append(self._program.typedefs[val])
-                except KeyError:
-                    raise KeyError(f"Missing typedef: '{val}'") from None
-
-        self.size = sum(sizes)
+                fields_expr = Concatenate(left=field_var, right=fields_expr)
+        self._fields_expr = fields_expr
 
     def strongest_postcondition(
             self, manager: FormulaManager, pf: PureFormula, buf_size: int
@@ -150,21 +189,12 @@ class Extract(Component):
         if len_after < 0:
             raise ValueError("Invalid buffer length")
 
-        new_buf_expr = None
-        substitution: dict[Variable, FormulaNode] = {}
-        new_vars: set = set()
-        for field, field_size in self.header_content.items():
-            field_var = self._program.get_header_var(self.header_reference + '.' + field)
-            if isinstance(field_size, str):
-                field_size = self._program.typedefs[field_size]
-            fresh_var = manager.fresh_variable(field_size)
-            substitution[field_var] = fresh_var
-            new_vars |= {fresh_var}
-            if new_buf_expr is None:
-                new_buf_expr = field_var
-            else:
-                new_buf_expr = Concatenate(left=field_var, right=new_buf_expr)
+        fresh_vars = manager.fresh_variables(self._field_sizes)
+        substitution: dict[Variable, FormulaNode] = dict(
+            zip(self._field_vars, fresh_vars)
+        )
 
+        new_buf_expr = self._fields_expr
         if len_after > 0:
             new_buf_var = self._program.get_buffer_var(len_after)
             new_buf_expr = Concatenate(left=new_buf_expr, right=new_buf_var)
@@ -172,7 +202,7 @@ class Extract(Component):
 
         return PureFormula(
             pf.root.substitute(substitution),
-            pf.used_vars | new_vars,
+            pf.used_vars.union(fresh_vars),
             pf.stream_var
         ), len_after
 
@@ -184,7 +214,7 @@ class Extract(Component):
 
 
 _METHOD_DISPATCH: dict[str, Callable[[ParserProgram, dict], Component]] = {
-    "extract": lambda program, call: Extract(program, call),
+    "extract": Extract,
 }
 
 
@@ -198,7 +228,7 @@ def parse_method_call(program: ParserProgram, component: dict) -> Component | No
     """
     if component.get("Node_Type") != "MethodCallStatement":
         logger.warning(
-            f"Ignoring non-method-call node type '{component.get('Node_Type')}'"
+            "Ignoring non-method-call node type '%s'", component.get("Node_Type")
         )
         return None
 
@@ -211,7 +241,7 @@ def parse_method_call(program: ParserProgram, component: dict) -> Component | No
     factory = _METHOD_DISPATCH.get(method_name)
 
     if factory is None:
-        logger.warning(f"Unsupported method call: '{method_name}()'")
+        logger.warning("Unsupported method call: '%s()'", method_name)
         return None
 
     return factory(program, call)
@@ -7,6 +7,7 @@ License: MIT (See LICENSE file or https://opensource.org/licenses/MIT for detail
 
 from __future__ import annotations
 
+import functools
 import logging
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING, Any
@@ -25,11 +26,42 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=4096)
+def _bv_node(value: int, size: int) -> Any:
+    """
+    Get the SMT bit-vector constant of a value and size.
+
+    The same constants appear in many transition conditions, so their pysmt
+    nodes (which belong to the global pysmt environment) are created once.
+
+    :param value: the numeric value of the constant
+    :param size: the bit-width of the constant
+    :return: the pysmt BV node
+    """
+    return BV(value, size)
+
+
 class Expression(FormulaNode):
     """An abstract base class representing an expression in a P4 parser state."""
 
+    __slots__ = ()
+
     def used_vars(self) -> set[Variable]:
-        return set()
+        # Walk the tree with an explicit stack, collecting into a single set
+        used: set[Variable] = set()
+        stack: list[FormulaNode] = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, BinaryExpression):
+                stack.append(node.left)
+                stack.append(node.right)
+            elif isinstance(node, (Slice, Reference)):
+                stack.append(node.reference)
+            elif isinstance(node, Variable):
+                used.add(node)
+            elif not isinstance(node, Expression):
+                used |= node.used_vars()
+        return used
 
     @abstractmethod
     def __len__(self) -> int:
@@ -52,14 +84,45 @@ class Expression(FormulaNode):
 class BinaryExpression(Expression, ABC):
     """A mixin for binary expressions that have a left and right operand."""
 
+    __slots__ = ("left", "right", "_size", "_smt")
+
     left: Expression
     right: Expression
+    # The bit-width of the expression, computed once as the operands are fixed
+    _size: int
+    # The SMT term of the expression, lowered on first use
+    _smt: Any
 
-    def used_vars(self) -> set[Variable]:
-        return self.left.used_vars() | self.right.used_vars()
+    def to_smt(self) -> Any:
+        # The operands never change, so the term is lowered once and then reused
+        smt = self._smt
+        if smt is None:
+            smt = self._smt = self._lower()
+        return smt
+
+    @abstractmethod
+    def _lower(self) -> Any:
+        """
+        Lower this expression to an SMT term.
+
+        :return: the pysmt term of this expression
+        """
+        pass
+
+    def substitute(
+            self, mapping: dict[Variable, FormulaNode]
+    ) -> FormulaNode:
+        left = self.left.substitute(mapping)
+        right = self.right.substitute(mapping)
+        if left is self.left and right is self.right:
+            # Nothing was substituted, so the (immutable) node can be reused
+            return self
+        return type(self)(left, right)
 
 
 class Concatenate(BinaryExpression):
+    __slots__ = ()
+
     def __init__(
             self,
             left: Expression,
@@ -71,6 +134,8 @@ class Concatenate(BinaryExpression):
             raise ValueError(f"Right operand is required.")
         self.left = left
         self.right = right
+        self._size = len(left) + len(right)
+        self._smt = None
 
     @staticmethod
     def parse(program: ParserProgram, obj: dict, size_context: int) -> Concatenate:
@@ -79,29 +144,82 @@ class Concatenate(BinaryExpression):
             parse_expression(program, obj["right"]),
         )
 
-    def to_smt(self):
-        return BVConcat(self.left.to_smt(), self.right.to_smt())
+    def _lower(self) -> Any:
+        # pysmt left-folds the terms into binary concatenations, so the gain is in
+        # merging the operands first, which leaves fewer terms to concatenate
+        terms = [operand.to_smt() for operand in self._operands()]
+        if len(terms) == 1:
+            return terms[0]
+        return BVConcat(*terms)
 
-    def substitute(
-            self, mapping: dict[Variable, FormulaNode]
-    ) -> Concatenate:
-        return Concatenate(
-            self.left.substitute(mapping),
-            self.right.substitute(mapping)
-        )
+    def _operands(self) -> list[FormulaNode]:
+        """
+        Get the operands of this (nested) concatenation, most significant first.
+
+        Adjacent constants are combined into one constant, and adjacent slices of
+        the same bits into one slice.
+
+        :return: the list of operands
+        """
+        operands: list[FormulaNode] = []
+        stack: list[FormulaNode] = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Concatenate):
+                stack.append(node.right)
+                stack.append(node.left)
+                continue
+
+            previous = operands[-1] if operands else None
+            if (
+                    isinstance(node, Constant)
+                    and isinstance(previous, Constant)
+                    and node._size
+                    and previous._size
+            ):
+                operands[-1] = Constant(
+                    (previous.numeric_value << node._size) | node.numeric_value,
+                    previous._size + node._size,
+                )
+            elif (
+                    isinstance(node, Slice)
+                    and isinstance(previous, Slice)
+                    and previous.lsb == node.msb + 1
+                    and _unwrap(previous.reference) is _unwrap(node.reference)
+            ):
+                operands[-1] = Slice(previous.reference, previous.msb, node.lsb)
+            else:
+                operands.append(node)
+        return operands
 
     def __len__(self) -> int:
-        return len(self.left) + len(self.right)
+        return self._size
 
     def __str__(self) -> str:
-        return f"({self.left}) ++ ({self.right})"
+        # Print nested concatenations iteratively and join the parts once, rather
+        # than copying the partial strings at every level
+        parts = []
+        stack: list[FormulaNode | str] = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+            elif isinstance(item, Concatenate):
+                stack.extend((")", item.right, ") ++ (", item.left, "("))
+            else:
+                parts.append(str(item))
+        return "".join(parts)
 
 
 class Slice(Expression):
+    __slots__ = ("reference", "msb", "lsb", "_size", "_smt")
+
     def __init__(self, reference, msb, lsb) -> None:
         self.reference = reference
         self.msb = msb
         self.lsb = lsb
+        self._size = msb - lsb + 1
+        self._smt = None
 
     @staticmethod
     def parse(program, obj: dict, size_context: int) -> Slice:
@@ -112,36 +230,46 @@ class Slice(Expression):
         )
 
     def to_smt(self) -> Any:
-        return BVExtract(
-            self.reference.to_smt(), self.lsb, self.msb
-        )  # BVExtract has both ends inclusive; start=msb, end=lsb
-
-    def used_vars(self) -> set[Variable]:
-        return self.reference.used_vars()
+        smt = self._smt
+        if smt is None:
+            smt = self._smt = _extract_smt(self.reference, self.msb, self.lsb)
+        return smt
 
     def substitute(
             self, mapping: dict[Variable, FormulaNode]
     ) -> FormulaNode:
-        return Slice(
-            self.reference.substitute(mapping),
-            self.msb,
-            self.lsb
-        )
+        reference = self.reference.substitute(mapping)
+        if reference is self.reference:
+            return self
+        return Slice(reference, self.msb, self.lsb)
 
     def __len__(self) -> int:
-        return self.msb - self.lsb + 1
+        return self._size
 
     def __str__(self) -> str:
         return f"{self.reference}[{self.msb}:{self.lsb}]"
 
 
 class Constant(Expression):
+    __slots__ = ("numeric_value", "_size")
+
     def __init__(self, numeric_value: int, size: int | None = None) -> None:
         self.numeric_value = numeric_value
-        self.value = bin(self.numeric_value)[2:]  # Convert to binary string
         self._size = size
+
+    @property
+    def value(self) -> str:
+        """
+        Get the binary representation of the constant, padded to its size.
+
+        It is only needed for printing, so it is built on demand.
+
+        :return: the binary string of the constant
+        """
+        value = bin(self.numeric_value)[2:]
         if self._size is not None:
-            self.value = self.value.zfill(self._size)
+            value = value.zfill(self._size)
+        return value
 
     @staticmethod
     def parse(program: ParserProgram, obj: dict, size_context: int) -> Constant:
@@ -150,7 +278,7 @@ class Constant(Expression):
     def to_smt(self) -> Any:
         if self._size is None:
             logger.warning("No size for constant of value %s", self.numeric_value)
-        return BV(self.numeric_value, len(self))
+        return _bv_node(self.numeric_value, len(self))
 
     def substitute(
             self, mapping: dict[Variable, FormulaNode]
@@ -175,16 +303,18 @@ class Constant(Expression):
             return NotImplemented
 
     def __str__(self) -> str:
-        return str(self.value)
+        return self.value
 
 
 class DontCare(Expression):
+    __slots__ = ()
+
     def __init__(self) -> None:
         pass
 
     @staticmethod
     def parse(program: ParserProgram, obj: dict, size_context: int) -> DontCare:
-        return DontCare()
+        return DONT_CARE
 
     def to_smt(self) -> Any:
         return TRUE()
@@ -198,16 +328,22 @@ class DontCare(Expression):
         return 0
 
     def __hash__(self) -> int:
-        return hash("DontCare")  # all DontCares are "equal" and hash identically
+        return hash("DontCare")  # all DontCares are equal and hash identically
 
     def __eq__(self, other) -> bool:
-        return True
+        return isinstance(other, DontCare)
 
     def __str__(self) -> str:
         return "*"
 
 
+# DontCare has no state, so a single instance is shared
+DONT_CARE = DontCare()
+
+
 class Reference(Expression):
+    __slots__ = ("_reference", "_size")
+
     def __init__(self, reference: Variable, size: int):
         self._reference = reference
         self._size = size
@@ -219,34 +355,40 @@ class Reference(Expression):
 
     @staticmethod
     def parse(program: ParserProgram, obj: dict, size_context: int) -> Reference:
-        reference = ""
+        # Collect the parts innermost-last, then join them in one go
+        parts = []
         while True:
             if "member" in obj:
-                reference = obj["member"] + ("." if reference else "") + reference
+                parts.append(obj["member"])
 
             if "expr" in obj:
                 obj = obj["expr"]
                 continue
 
             if "path" in obj:
-                reference = obj["path"]["name"] + ("." if reference else "") + reference
+                parts.append(obj["path"]["name"])
             break
-
-        return Reference(
-            program.get_header_var(reference),
-            program.get_header(reference),
-        )
+        reference = ".".join(reversed(parts))
+
+        # All occurrences of a header field in a program share one (immutable)
+        # Reference, which is interned with the other parsed expressions
+        variable = program.get_header_var(reference)
+        key = (Reference, variable)
+        interned = program.expressions.get(key)
+        if interned is None:
+            # The size of the variable has any typedef already resolved
+            interned = program.expressions[key] = Reference(variable, len(variable))
+        return interned
 
     def to_smt(self) -> Any:
         return self._reference.to_smt()
 
-    def used_vars(self) -> set[Variable]:
-        return self._reference.used_vars()
-
     def substitute(
             self, mapping: dict[Variable, FormulaNode]
     ) -> FormulaNode:
-        return self._reference.substitute(mapping)
+        # The reference is always a plain variable, so substituting it is a
+        # single lookup (keeping this node when the variable is not replaced)
+        return mapping.get(self._reference, self)
 
     def __len__(self) -> int:
         return self._size
@@ -256,10 +398,12 @@ class Reference(Expression):
 
 
 class MethodCall(Expression):
-    pass
+    __slots__ = ()
 
 
 class BVAnd(BinaryExpression):
+    __slots__ = ()
+
     def __init__(
             self,
             left: Expression,
@@ -267,6 +411,8 @@ class BVAnd(BinaryExpression):
     ) -> None:
         self.left = left
         self.right = right
+        self._size = max(len(left), len(right))
+        self._smt = None
 
     @staticmethod
     def parse(program: ParserProgram, obj: dict, size_context: int) -> BVAnd:
@@ -275,25 +421,24 @@ class BVAnd(BinaryExpression):
             parse_expression(program, obj["right"], size_context)
         )
 
-    def to_smt(self) -> Any:
-        return pysmt.BVAnd(self.left.to_smt(), self.right.to_smt())
-
-    def substitute(
-            self, mapping: dict[Variable, FormulaNode]
-    ) -> FormulaNode:
-        return BVAnd(
-            self.left.substitute(mapping),
-            self.right.substitute(mapping),
-        )
+    def _lower(self) -> Any:
+        left, right = self.left, self.right
+        if isinstance(left, Constant):
+            left, right = right, left
+        if isinstance(right, Constant) and right._size == len(left) == self._size:
+            return _masked_smt(left, right.numeric_value, self._size)
+        return pysmt.BVAnd(left.to_smt(), right.to_smt())
 
     def __len__(self) -> int:
-        return max(len(self.left), len(self.right))
+        return self._size
 
     def __str__(self) -> str:
         return f"({self.left} & {self.right})"
 
 
 class BVLShr(BinaryExpression):
+    __slots__ = ()
+
     def __init__(
             self,
             left: Expression,
@@ -301,6 +446,8 @@ class BVLShr(BinaryExpression):
     ) -> None:
         self.left = left
         self.right = right
+        self._size = len(left)
+        self._smt = None
 
     @staticmethod
     def parse(program: ParserProgram, obj: dict, size_context: int) -> BVLShr:
@@ -309,24 +456,93 @@ class BVLShr(BinaryExpression):
             parse_expression(program, obj["right"], size_context),
         )
 
-    def to_smt(self) -> Any:
+    def _lower(self) -> Any:
         return pysmt.BVLShr(self.left.to_smt(), self.right.to_smt())
 
-    def substitute(
-            self, mapping: dict[Variable, FormulaNode]
-    ) -> FormulaNode:
-        return BVLShr(
-            self.left.substitute(mapping),
-            self.right.substitute(mapping),
-        )
-
     def __len__(self) -> int:
-        return len(self.left)
+        return self._size
 
     def __str__(self) -> str:
         return f"({self.left} >> {self.right})"
 
 
+def _unwrap(node: FormulaNode) -> FormulaNode:
+    """
+    Get the variable behind a Reference, or the node itself otherwise.
+
+    :param node: the node to unwrap
+    :return: the referenced variable or the given node
+    """
+    return node.reference if isinstance(node, Reference) else node
+
+
+def _extract_smt(node: FormulaNode, msb: int, lsb: int) -> Any:
+    """
+    Get the SMT term for bits msb down to lsb (both inclusive) of a node.
+
+    Extractions from slices and concatenations are narrowed down to the operand
+    holding the bits, so that the solver does not receive the intermediate term.
+
+    :param node: the node to extract from
+    :param msb: the most significant bit to extract
+    :param lsb: the least significant bit to extract
+    :return: the pysmt term of the extraction
+    """
+    while True:
+        node = _unwrap(node)
+        if isinstance(node, Slice):
+            msb += node.lsb
+            lsb += node.lsb
+            node = node.reference
+        elif isinstance(node, Concatenate):
+            right_size = len(node.right)
+            if msb < right_size:
+                node = node.right
+            elif lsb >= right_size:
+                msb -= right_size
+                lsb -= right_size
+                node = node.left
+            else:
+                break
+        else:
+            break
+
+    if lsb == 0 and msb == len(node) - 1:
+        return node.to_smt()
+    return BVExtract(node.to_smt(), lsb, msb)
+
+
+def _masked_smt(node: FormulaNode, mask: int, size: int) -> Any:
+    """
+    Get the SMT term for a node masked by a constant with a bitwise and.
+
+    The mask is split into runs of ones and zeros, which become extractions of
+    the node and zero constants respectively, so the solver does not need to
+    reason about the conjunction bit by bit.
+
+    :param node: the node that is masked
+    :param mask: the value of the mask
+    :param size: the bit-width of both the node and the mask
+    :return: the pysmt term of the masked node
+    """
+    terms = []
+    msb = size - 1
+    while msb >= 0:
+        bit = (mask >> msb) & 1
+        lsb = msb
+        while lsb > 0 and (mask >> (lsb - 1)) & 1 == bit:
+            lsb -= 1
+        if bit:
+            terms.append(_extract_smt(node, msb, lsb))
+        else:
+            terms.append(_bv_node(0, msb - lsb + 1))
+        msb = lsb - 1
+
+    if len(terms) == 1:
+        return terms[0]
+    return BVConcat(*terms)
+
+
 _EXPRESSION_DISPATCH: dict[
     str,
     type[Concatenate | Slice | Constant | Reference | MethodCall | DontCare | BVAnd | BVLShr]
@@ -343,12 +559,37 @@ _EXPRESSION_DISPATCH: dict[
 }
 
 
+def _structural_key(expression: Expression) -> tuple | None:
+    """
+    Get the key that identifies an expression by its structure.
+
+    Operands are keyed by identity, which only identifies them as long as they
+    are alive. The expression that is stored under the key (in
+    ParserProgram.expressions) references its operands, so these stay alive for
+    as long as the entry does. The table is cleared when parsing ends, so no
+    key outlives the parse either.
+
+    :param expression: the (freshly parsed) expression
+    :return: the structural key, or None if the expression is not shared this way
+    """
+    if isinstance(expression, BinaryExpression):
+        return type(expression), id(expression.left), id(expression.right)
+    if isinstance(expression, Slice):
+        return Slice, id(expression.reference), expression.msb, expression.lsb
+    if isinstance(expression, Constant):
+        return Constant, expression.numeric_value, expression._size
+    return None
+
+
 def parse_expression(
         program: ParserProgram, component: dict, size_context: int = None
 ) -> Expression:
     """
     Parse a P4 expression component into an Expression object.
 
+    Identical subtrees (such as a mask used in several transitions) of the same
+    program are shared.
+
     :param program: the ParserProgram this expression belongs to
     :param component: the JSON object representing the expression
     :param size_context: an optional size context for disambiguating bit-width
@@ -357,7 +598,11 @@ def parse_expression(
     node_type = component.get("Node_Type")
     cls = _EXPRESSION_DISPATCH.get(node_type)
     if cls is None:
-        logger.warning(f"Unknown expression node type: {node_type}")
-        return DontCare()
-
-    return cls.parse(program, component, size_context)
+        logger.warning("Unknown expression node type: %s", node_type)
+        return DONT_CARE
+
+    expression = cls.parse(program, component, size_context)
+    key = _structural_key(expression)
+    if key is None:
+        return expression
+    return program.expressions.setdefault(key, expression)
@@ -8,7 +8,7 @@ License: MIT (See LICENSE file or https://opensource.org/licenses/MIT for detail
 from __future__ import annotations
 
 import logging
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable
 
 from bisimulation.formula import FormulaManager, PureFormula
 from program.component import Assignment, Component, Extract, parse_method_call
@@ -18,10 +18,17 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+_COMPONENT_DISPATCH: dict[str, Callable[[ParserProgram, dict], Component | None]] = {
+    "AssignmentStatement": Assignment,
+    "MethodCallStatement": parse_method_call,
+}
+
 
 class OperationBlock(Component):
     """A class representing the operation block of a P4 parser state."""
 
+    __slots__ = ("_program", "_components", "_size")
+
     def __init__(self, program: ParserProgram, components: dict = None):
         """
         Initialise an OperationBlock object.
@@ -72,18 +79,17 @@ class OperationBlock(Component):
         :param components: the components JSON object, which contains a list of components
         """
         for component in components["vec"]:
-            match component["Node_Type"]:
-                case "AssignmentStatement":
-                    parsed_component = Assignment(self._program, component)
-                case "MethodCallStatement":
-                    parsed_component = parse_method_call(self._program, component)
-                    if isinstance(parsed_component, Extract):
-                        self._size += parsed_component.size
-                case _:
-                    logger.warning(
-                        f"Ignoring unknown component type '{component['Node_Type']}'"
-                    )
-                    continue
+            node_type = component["Node_Type"]
+            factory = _COMPONENT_DISPATCH.get(node_type)
+            if factory is None:
+                logger.warning("Ignoring unknown component type '%s'", node_type)
+                continue
+
+            parsed_component = factory(self._program, component)
+            if parsed_component is None:
+                continue
+            if isinstance(parsed_component, Extract):
+                self._size += parsed_component.size
             self._components.append(parsed_component)
 
     def strongest_postcondition(
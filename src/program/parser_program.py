@@ -6,18 +6,49 @@ Author: Jort van Leenen
 License: MIT (See LICENSE file or https://opensource.org/licenses/MIT for details)
 """
 
+from __future__ import annotations
+
+import itertools
 import logging
+import sys
+from typing import TYPE_CHECKING, Callable
 
 from bisimulation.formula import Variable
 from octopus.utils import ReprMixin
 from program.parser_state import ParserState
 
+if TYPE_CHECKING:
+    from program.expression import Expression
+
 logger = logging.getLogger(__name__)
 
+# The built-in states of every P4 parser, which are not parsed as ParserStates
+TERMINAL_STATES = frozenset(("accept", "reject"))
+
+# How to obtain the size of a header or struct field, by the node type of its type
+_FIELD_SIZE_GETTERS: dict[str, Callable[[dict], int | str]] = {
+    "Type_Bits": lambda field_type: field_type["size"],
+    "Type_Name": lambda field_type: field_type["path"]["name"],
+}
+
 
 class ParserProgram(ReprMixin):
     """A class representing a P4 parser program with its input and output types."""
 
+    __slots__ = (
+        "_types",
+        "_typedefs",
+        "_input_name",
+        "_output_name",
+        "_output_type",
+        "_states",
+        "_is_left",
+        "_header_cache",
+        "_header_var_cache",
+        "_header_fields_cache",
+        "_expressions",
+    )
+
     def __init__(self, json: dict | None = None, is_left: bool = False):
         """
         Initialise a ParserProgram object.
@@ -36,6 +67,15 @@ class ParserProgram(ReprMixin):
 
         self._is_left = is_left
 
+        # Resolved header references and their variables, as these are looked up
+        # repeatedly during symbolic execution while the types no longer change
+        # after parsing
+        self._header_cache: dict[str, dict[str, int] | int] = {}
+        self._header_var_cache: dict[str, Variable] = {}
+        self._header_fields_cache: dict[str, tuple[tuple[Variable, int], ...]] = {}
+        # The expressions parsed so far, by their structural key
+        self._expressions: dict[tuple, Expression] = {}
+
         if json is not None:
             self.parse(json)
 
@@ -102,6 +142,18 @@ class ParserProgram(ReprMixin):
         """
         return self._is_left
 
+    @property
+    def expressions(self) -> dict[tuple, Expression]:
+        """
+        Get the expressions parsed so far, by their structural key.
+
+        Identical expressions of this program are shared through this table
+        while it is parsed. It is emptied once parsing is done.
+
+        :return: a dictionary of structural keys to Expression objects
+        """
+        return self._expressions
+
     def parse(self, data: dict) -> None:
         """
         Parse IR JSON data into a ParserProgram object.
@@ -113,27 +165,21 @@ class ParserProgram(ReprMixin):
         if "objects" not in data or "vec" not in data["objects"]:
             raise ValueError("Invalid JSON data")
 
-        for obj in data["objects"]["vec"]:
-            match obj["Node_Type"]:
-                case "Type_Typedef":
-                    self._parse_typedef(obj)
-                case "Type_Header" | "Type_Struct":
-                    logger.info(f"Parsing type '{obj['Node_Type']}'...")
-                    logger.debug(f"For: '{obj}'")
-                    self._parse_data_type(obj)
-                case "P4Parser":
-                    if len(self._states) > 0:
-                        logger.warning(
-                            "Multiple parser blocks found, only the first one is used."
-                        )
-                        continue
-                    logger.info("Parsing parser block...")
-                    logger.debug(f"For: '{obj}'")
-                    self._parse_parser_block(obj)
-                case _:
+        get_handler = self._OBJECT_HANDLERS.get
+        try:
+            for obj in data["objects"]["vec"]:
+                handler = get_handler(obj["Node_Type"])
+                if handler is None:
                     logger.debug(
-                        f"Ignoring type '{obj['Node_Type']}' of object '{obj}'"
+                        "Ignoring type '%s' of object '%s'", obj["Node_Type"], obj
                     )
+                    continue
+                handler(self, obj)
+        finally:
+            # Expressions are only shared while parsing. The keys identify operands
+            # by id(), which would not be valid in another process (e.g., once
+            # built in parallel) or after the table no longer keeps them alive.
+            self._expressions.clear()
 
     def _parse_typedef(self, obj: dict) -> None:
         """
@@ -141,9 +187,9 @@ class ParserProgram(ReprMixin):
 
         :param obj: the typedef object to parse
         """
-        type_name = obj["name"]
+        type_name = sys.intern(obj["name"])
         size = obj["type"]["size"]
-        logger.info(f"Parsed typedef '{type_name}' with size: {size}")
+        logger.info("Parsed typedef '%s' with size: %s", type_name, size)
         self.typedefs[type_name] = size
 
     def _parse_data_type(self, obj: dict) -> None:
@@ -157,21 +203,27 @@ class ParserProgram(ReprMixin):
 
         :param obj: the data type object to parse
         """
-        type_name = obj["name"]
-        fields = {}
-        for field in obj["fields"]["vec"]:
-            name = field["name"]
-            match field["type"]["Node_Type"]:
-                case "Type_Bits":
-                    fields[name] = field["type"]["size"]
-                case "Type_Name":
-                    fields[name] = field["type"]["path"]["name"]
-                case _:
+        logger.info("Parsing type '%s'...", obj["Node_Type"])
+        logger.debug("For: '%s'", obj)
+
+        # Type and field names are used as dictionary keys throughout, so they
+        # are interned to share one string object per name
+        type_name = sys.intern(obj["name"])
+        field_objs = obj["fields"]["vec"]
+        fields = {
+            sys.intern(field["name"]): get_size(field["type"])
+            for field in field_objs
+            if (get_size := _FIELD_SIZE_GETTERS.get(field["type"]["Node_Type"]))
+        }
+        if len(fields) != len(field_objs):
+            for field in field_objs:
+                node_type = field["type"]["Node_Type"]
+                if node_type not in _FIELD_SIZE_GETTERS:
                     logger.warning(
-                        f"Unknown node type '{field['type']['Node_Type']}' for '{name}'"
+                        "Unknown node type '%s' for '%s'", node_type, field["name"]
                     )
 
-        logger.info(f"Parsed type '{type_name}' with fields: {fields}")
+        logger.info("Parsed type '%s' with fields: %s", type_name, fields)
         self._types[type_name] = fields
 
     def _parse_parser_block(self, obj: dict) -> None:
@@ -184,54 +236,73 @@ class ParserProgram(ReprMixin):
 
         :param obj: the parser object to parse
         """
+        if len(self._states) > 0:
+            logger.warning("Multiple parser blocks found, only the first one is used.")
+            return
+        logger.info("Parsing parser block...")
+        logger.debug("For: '%s'", obj)
+
         parameters = obj["type"]["applyParams"]["parameters"]["vec"]
+        local_variables = obj["parserLocals"]["vec"]
+        states = obj["states"]["vec"]
+
         if len(parameters) != 2:
             logger.warning(
-                f"Expected 2 parameters for the parser, found {len(parameters)}"
+                "Expected 2 parameters for the parser, found %d", len(parameters)
             )
 
         for parameter in parameters:
-            name = parameter["name"]
-            logger.info(f"Parsing parameter '{name}'...")
+            name = sys.intern(parameter["name"])
+            type_name = sys.intern(parameter["type"]["path"]["name"])
+            logger.info("Parsing parameter '%s'...", name)
             if parameter["direction"] == "out":
                 self._output_name = name
-                self._output_type = parameter["type"]["path"]["name"]
-            elif parameter["type"]["path"]["name"] == "packet_in":
+                self._output_type = type_name
+            elif type_name == "packet_in":
                 self._input_name = name
 
         if self._input_name is None or self._output_name is None:
             raise ValueError("Could not determine both input and output parameters")
         logger.info(
-            f"Parsed parameters. Input '{self._input_name}', output '{self._output_name}'"
+            "Parsed parameters. Input '%s', output '%s'",
+            self._input_name,
+            self._output_name,
         )
 
-        local_variables = obj["parserLocals"]["vec"]
         node_id_map: dict[int, int] = dict()
         for variable in local_variables:
+            var_name = sys.intern(variable["name"])
             var_type = variable["type"]
-            if "size" in var_type:
-                size = var_type["size"]
-                node_id_map[var_type["Node_ID"]] = size
+            node_id = var_type["Node_ID"]
+            size = var_type.get("size")
+            if size is not None:
+                node_id_map[node_id] = size
             else:
-                size = node_id_map[var_type["Node_ID"]]
+                size = node_id_map[node_id]
 
-            self._types[variable["name"]] = size
+            self._types[var_name] = size
 
-            logger.debug(
-                f"Parsed local variable '{variable['name']}' with size: {size}"
-            )
+            logger.debug("Parsed local variable '%s' with size: %s", var_name, size)
 
-        states = obj["states"]["vec"]
         for state in states:
-            name = state["name"]
-            logger.info(f"Parsing state '{name}'...")
-            if name in ["reject", "accept"]:
+            name = sys.intern(state["name"])
+            logger.info("Parsing state '%s'...", name)
+            if name in TERMINAL_STATES:
                 continue
             self._states[name] = ParserState(
                 self, state["components"], state["selectExpression"]
             )
 
-        logger.info(f"Parsed states (excluding terminals): {list(self._states.keys())}")
+        logger.info("Parsed states (excluding terminals): %s", list(self._states))
+
+    # The handlers of the top-level IR objects, by node type. The IR of other
+    # objects is dropped before it is cached (see octopus.main._prune_ir()).
+    _OBJECT_HANDLERS: dict[str, Callable[[ParserProgram, dict], None]] = {
+        "Type_Typedef": _parse_typedef,
+        "Type_Header": _parse_data_type,
+        "Type_Struct": _parse_data_type,
+        "P4Parser": _parse_parser_block,
+    }
 
     def get_header(self, reference: str) -> dict[str, int] | int:
         """
@@ -249,34 +320,74 @@ class ParserProgram(ReprMixin):
         :param reference: a reference to a header or a field in a header
         :return: a dictionary of fields and their sizes, or a size
         """
-        if reference.startswith(self._output_name + "."):
-            normalised_reference = reference.removeprefix(self._output_name + ".")
+        cached = self._header_cache.get(reference)
+        if cached is not None:
+            return cached
+
+        # Resolve the reference one part at a time on top of its (cached) parent,
+        # so a reference costs a single lookup once its parent has been resolved
+        parent, _, part = reference.rpartition(".")
+        if not parent:
+            type_content = self._types
+        elif parent == self._output_name:
             type_content = self._types.get(self._output_type)
+            if type_content is None:
+                raise KeyError(f"Output type '{self._output_type}' not found in types")
         else:
-            normalised_reference = reference
-            type_content = self._types
+            type_content = self.get_header(parent)
 
-        if type_content is None:
-            raise KeyError(f"Output type '{self._output_type}' not found in types")
+        if part not in type_content:
+            raise KeyError(f"Reference part '{part}' not found in type content")
+        type_content = type_content[part]
+        if type_content in self._types:
+            # If found, then it is a reference to a type and not a field
+            type_content = self._types[type_content]
 
-        reference_parts = normalised_reference.split(".")
-        for part in reference_parts:
-            if part not in type_content:
-                raise KeyError(f"Reference part '{part}' not found in type content")
-            type_content = type_content[part]
-            if type_content in self._types:
-                # If found, then it is a reference to a type and not a field
-                type_content = self._types[type_content]
-
-        logger.debug(f"Obtained header fields for '{reference}': {type_content}")
+        logger.debug("Obtained header fields for '%s': %s", reference, type_content)
+        self._header_cache[reference] = type_content
         return type_content
 
     def get_header_var(self, name: str):
+        var = self._header_var_cache.get(name)
+        if var is not None:
+            return var
+
         prefix = "hdr_l." if self._is_left else "hdr_r."
         size = self.get_header(name)
         if isinstance(size, str):
             size = self.typedefs[size]
-        return Variable(prefix + name, size)
+        # Interned names make comparing and hashing header variables cheaper
+        var = Variable(sys.intern(prefix + name), size)
+        self._header_var_cache[name] = var
+        return var
+
+    def get_header_fields(self, reference: str) -> tuple[tuple[Variable, int], ...]:
+        """
+        Get the variables and sizes of the fields of a header, in declaration order.
+
+        The same header is typically extracted in several parser states, so the
+        result is computed once per header.
+
+        :param reference: a reference to a header
+        :return: a tuple of (variable, size) pairs, one for every field
+        """
+        fields = self._header_fields_cache.get(reference)
+        if fields is not None:
+            return fields
+
+        typedefs = self._typedefs
+        resolved = []
+        for field, size in self.get_header(reference).items():
+            if not isinstance(size, int):
+                try:
+                    size = typedefs[size]
+                except KeyError:
+                    raise KeyError(f"Missing typedef: '{size}'") from None
+            resolved.append((self.get_header_var(f"{reference}.{field}"), size))
+
+        fields = tuple(resolved)
+        self._header_fields_cache[reference] = fields
+        return fields
 
     def get_buffer_var(self, size: int):
         name = "buf_l" if self._is_left else "buf_r"
@@ -310,23 +421,26 @@ class ParserProgram(ReprMixin):
         return result
 
     def __str__(self):
-        n_spaces = 2
-        output = [
-            "Parser",
-            n_spaces * " " + f"Input name: {self._input_name}",
-            n_spaces * " " + f"Output: {self._output_name} ({self._output_type})",
-            n_spaces * " " + "Types:",
-        ]
-        for name, fields in self._types.items():
-            output.append(2 * n_spaces * " " + f"{name}: {fields}")
-
-        output.append(n_spaces * " " + "States:")
-        for name, content in self._states.items():
-            output.append(2 * n_spaces * " " + f"{name}:")
-            output.append(
-                "\n".join(
-                    3 * n_spaces * " " + line for line in str(content).splitlines()
-                )
+        indent = 2 * " "
+        return "\n".join(
+            itertools.chain(
+                (
+                    "Parser",
+                    f"{indent}Input name: {self._input_name}",
+                    f"{indent}Output: {self._output_name} ({self._output_type})",
+                    f"{indent}Types:",
+                ),
+                (
+                    f"{2 * indent}{name}: {fields}"
+                    for name, fields in self._types.items()
+                ),
+                (f"{indent}States:",),
+                itertools.chain.from_iterable(
+                    itertools.chain(
+                        (f"{2 * indent}{name}:",),
+                        (3 * indent + line for line in str(content).splitlines()),
+                    )
+                    for name, content in self._states.items()
+                ),
             )
-
-        return "\n".join(output)
+        )
@@ -7,6 +7,7 @@ License: MIT (See LICENSE file or https://opensource.org/licenses/MIT for detail
 
 from __future__ import annotations
 
+import itertools
 import logging
 from typing import TYPE_CHECKING
 
@@ -22,6 +23,8 @@ logger = logging.getLogger(__name__)
 class ParserState:
     """A class representing a state in a P4 parser block."""
 
+    __slots__ = ("_program", "_operationBlock", "_transitionBlock")
+
     def __init__(
         self,
         program: ParserProgram,
@@ -85,16 +88,12 @@ class ParserState:
         )
 
     def __str__(self):
-        n_spaces = 2
-        output = [
-            "Operations:",
-            "\n".join(
-                n_spaces * " " + line for line in str(self._operationBlock).splitlines()
-            ),
-            "Transitions:",
-            "\n".join(
-                n_spaces * " " + line
-                for line in str(self._transitionBlock).splitlines()
-            ),
-        ]
-        return "\n".join(output)
+        indent = 2 * " "
+        return "\n".join(
+            itertools.chain(
+                ("Operations:",),
+                (indent + line for line in str(self._operationBlock).splitlines()),
+                ("Transitions:",),
+                (indent + line for line in str(self._transitionBlock).splitlines()),
+            )
+        )
@@ -7,9 +7,10 @@ License: MIT (See LICENSE file or https://opensource.org/licenses/MIT for detail
 
 from __future__ import annotations
 
-import copy
+import itertools
 import logging
-from typing import TYPE_CHECKING
+import sys
+from typing import TYPE_CHECKING, Callable
 
 from bisimulation.formula import (
     TRUE,
@@ -18,7 +19,7 @@ from bisimulation.formula import (
     FormulaNode,
     Not,
 )
-from program.expression import DontCare, Expression, parse_expression
+from program.expression import DONT_CARE, DontCare, Expression, parse_expression
 
 if TYPE_CHECKING:
     from program.parser_program import ParserProgram
@@ -29,6 +30,8 @@ logger = logging.getLogger(__name__)
 class TransitionBlock:
     """A class representing the transition block of a P4 parser state."""
 
+    __slots__ = ("_program", "_selectors", "_cases", "_symbolic_transitions")
+
     def __init__(self, program: ParserProgram, select_expr: dict | None = None):
         """
         Initialise a TransitionBlock object.
@@ -39,6 +42,7 @@ class TransitionBlock:
         self._program = program
         self._selectors: list[Expression] = []
         self._cases: dict[tuple[Expression, ...], str] = {}
+        self._symbolic_transitions: frozenset[tuple[FormulaNode, str]] | None = None
         if select_expr is not None:
             self.parse(select_expr)
 
@@ -80,16 +84,22 @@ class TransitionBlock:
         :param select_expr: the selectExpression JSON object
         """
         select_type: str = select_expr["Node_Type"]
-        match select_type:
-            case "SelectExpression":
-                self._parse_select_expression(select_expr)
-            case "PathExpression":
-                selector: tuple[Expression] = (DontCare(),)
-                to_state_name: str = select_expr["path"]["name"]
-                self._cases[selector] = to_state_name
-                logger.info(f"Parsed 'dont_care' transition to '{to_state_name}'")
-            case _:
-                logger.warning(f"Ignoring selectExpression of type '{select_type}'")
+        handler = self._SELECT_HANDLERS.get(select_type)
+        if handler is None:
+            logger.warning("Ignoring selectExpression of type '%s'", select_type)
+            return
+        handler(self, select_expr)
+
+    def _parse_path_expression(self, select_expr: dict) -> None:
+        """
+        Parse an unconditional transition (a PathExpression JSON).
+
+        :param select_expr: the selectExpression JSON object
+        """
+        selector: tuple[Expression] = (DONT_CARE,)
+        to_state_name: str = sys.intern(select_expr["path"]["name"])
+        self._cases[selector] = to_state_name
+        logger.info("Parsed 'dont_care' transition to '%s'", to_state_name)
 
     def _parse_select_expression(self, select_expr: dict) -> None:
         """
@@ -97,38 +107,58 @@ class TransitionBlock:
 
         :param select_expr: the selectExpression JSON object
         """
+        program = self._program
+        selectors = self._selectors
         for expression in select_expr["select"]["components"]["vec"]:
-            self._selectors.append(parse_expression(self._program, expression))
-            logger.info(f"Parsed selector: {self._selectors[-1]}")
+            selector = parse_expression(program, expression)
+            selectors.append(selector)
+            logger.info("Parsed selector: %s", selector)
 
+        # The keyset expressions of every case are sized by the selectors
+        selector_sizes = [len(selector) for selector in selectors]
         for case in select_expr["selectCases"]["vec"]:
-            for_exprs = []
             keyset = case["keyset"]
-            if "components" in keyset and "vec" in keyset["components"]:
-                for i, expression in enumerate(keyset["components"]["vec"]):
-                    for_exprs.append(
-                        parse_expression(
-                            self._program, expression, len(self._selectors[i])
-                        )
+            components = keyset.get("components")
+            if components is not None and "vec" in components:
+                for_exprs = [
+                    parse_expression(program, expression, size)
+                    for expression, size in zip(
+                        components["vec"], selector_sizes, strict=True
                     )
+                ]
             else:
-                for_exprs.append(
-                    parse_expression(self._program, keyset, len(self._selectors[0]))
-                )
-            to_state_name = case["state"]["path"]["name"]
+                for_exprs = [parse_expression(program, keyset, selector_sizes[0])]
+            to_state_name = sys.intern(case["state"]["path"]["name"])
             self._cases[tuple(for_exprs)] = to_state_name
 
-            logger.info(f"Parsed transition to '{to_state_name}' for '{for_exprs}'")
+            logger.info("Parsed transition to '%s' for '%s'", to_state_name, for_exprs)
+
+    _SELECT_HANDLERS: dict[str, Callable[[TransitionBlock, dict], None]] = {
+        "SelectExpression": _parse_select_expression,
+        "PathExpression": _parse_path_expression,
+    }
 
-    def symbolic_transition(self) -> set[tuple[FormulaNode, str]]:
+    def symbolic_transition(self) -> frozenset[tuple[FormulaNode, str]]:
         """
         Generate symbolic transitions based on the transition block.
 
-        :param pf: the PureFormula representing the current state of symbolic execution
+        The transitions only depend on the parsed cases, and formula nodes are
+        never modified after construction, so they are generated once and shared.
+
+        :return: a set of tuples containing the symbolic condition and the state to transition to
+        """
+        if self._symbolic_transitions is None:
+            self._symbolic_transitions = self._generate_symbolic_transitions()
+        return self._symbolic_transitions
+
+    def _generate_symbolic_transitions(self) -> frozenset[tuple[FormulaNode, str]]:
+        """
+        Generate the symbolic transitions of this transition block.
+
         :return: a set of tuples containing the symbolic condition and the state to transition to
         """
         if len(self._selectors) == 0:
-            return {(TRUE(), self._cases[tuple([DontCare()])])}
+            return frozenset({(TRUE(), self._cases[(DONT_CARE,)])})
 
         symbolic_transitions: set[tuple[FormulaNode, str]] = set()
         seen: set[FormulaNode] = set()
@@ -136,9 +166,7 @@ class TransitionBlock:
             formula = TRUE()
             for i, expr in enumerate(for_exprs):
                 if not isinstance(expr, DontCare):
-                    expr_copy = copy.deepcopy(expr)
-                    selector_copy = copy.deepcopy(self._selectors[i])
-                    formula = And(formula, Equals(expr_copy, selector_copy))
+                    formula = And(formula, Equals(expr, self._selectors[i]))
             appended_formula = formula
             for seen_formula in seen:
                 appended_formula = And(appended_formula, Not(seen_formula))
@@ -146,22 +174,28 @@ class TransitionBlock:
             seen.add(formula)
             symbolic_transitions.add((appended_formula, to_state))
 
-        logger.debug(f"Symbolic transitions (left: {self._program.is_left}):")
-        for condition, state in symbolic_transitions:
-            logger.debug(f"  {condition} -> {state}")
-        return symbolic_transitions
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Symbolic transitions (left: %s):", self._program.is_left)
+            for condition, state in symbolic_transitions:
+                logger.debug("  %s -> %s", condition, state)
+        return frozenset(symbolic_transitions)
 
     def __repr__(self) -> str:
         return f"TransitionBlock(values={self._selectors!r}, cases={self._cases!r})"
 
     def __str__(self) -> str:
-        n_spaces = 2
-        output = []
-        if self._selectors:
-            output.append(f"Values: ({', '.join(str(v) for v in self._selectors)})")
-
-        output.append("Cases:")
-        for key, state in self._cases.items():
-            key_str = ", ".join(str(k) for k in key)
-            output.append(" " * n_spaces + f"({key_str}) -> {state}")
-        return "\n".join(output)
+        indent = 2 * " "
+        header = (
+            (f"Values: ({', '.join(map(str, self._selectors))})", "Cases:")
+            if self._selectors
+            else ("Cases:",)
+        )
+        return "\n".join(
+            itertools.chain(
+                header,
+                (
+                    f"{indent}({', '.join(map(str, key))}) -> {state}"
+                    for key, state in self._cases.items()
+                ),
+            )
+        )
@@ -8,11 +8,17 @@ License: MIT (See LICENSE file or https://opensource.org/licenses/MIT for detail
 """
 
 import argparse
+import contextlib
+import itertools
+import os
 import re
+import signal
+import socket
 import statistics
 import subprocess
 import sys
 import tempfile
+import time
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, List
@@ -36,6 +42,30 @@ TIME_CMD = ["/usr/bin/time", "-v"]
 GEN_RE = re.compile(r"\[TIMING]\s*generation=(\d+\.\d+)")
 VAL_RE = re.compile(r"\[TIMING]\s*validation=(\d+\.\d+)")
 MEM_RE = re.compile(r"Maximum resident set size .*?:\s*(\d+)")
+CONCLUSION_RE = re.compile(r"The two parsers are (NOT )?equivalent\.")
+CACHE_HIT_RE = re.compile(r"Loaded IR JSON of '(.*)' from cache")
+
+# A variant of tests/correct_cases/hello-octopus.p4 that includes its header type
+INCLUDE_MAIN_P4 = """\
+#include <core.p4>
+#include "hdr.p4"
+
+struct headers_t {
+    hdr_t octopus;
+}
+
+parser Parser(packet_in pkt, out headers_t hdr) {
+    state start {
+        pkt.extract(hdr.octopus);
+        transition accept;
+    }
+}
+
+parser Parser_t(packet_in pkt, out headers_t hdr);
+package Package(Parser_t p);
+
+Package(Parser()) main;
+"""
 
 
 @dataclass(frozen=True)
@@ -269,6 +299,49 @@ def get_whippersnapper_equiv_benchmarks() -> List[Benchmark]:
     ]
 
 
+def get_regression_benchmarks() -> List[Benchmark]:
+    """
+    Get every pair of P4 programs among the correct and incorrect cases.
+
+    Programs are paired with themselves and with the other programs in the
+    same directory.
+
+    :return: a list of Benchmark objects representing the pairs
+    """
+    benchmarks = []
+    for root in (Path("tests/correct_cases"), Path("tests/incorrect_cases")):
+        directories = [root, *sorted(p for p in root.iterdir() if p.is_dir())]
+        for directory in directories:
+            files = sorted(directory.glob("*.p4"))
+            for file1, file2 in itertools.combinations_with_replacement(files, 2):
+                benchmarks.append(
+                    Benchmark(
+                        f"{file1.relative_to('tests')} vs. {file2.name}",
+                        file1,
+                        file2,
+                    )
+                )
+    return benchmarks
+
+
+def get_regression_variants() -> List[BenchmarkRun]:
+    """
+    Get the variants of Octopus that must agree on the verdict of every pair.
+
+    The value of an argument is None for a flag.
+
+    :return: a list of BenchmarkRun objects representing the variants
+    """
+    return [
+        BenchmarkRun("octopus_default", {}),
+        BenchmarkRun("octopus_subsumption", {"subsumption": None}),
+        # A trivial accepting filter disables the shortcut for identical programs
+        BenchmarkRun("octopus_bisimulation", {"filter-accepting-string": "True"}),
+        # The socket of the daemon is filled in by run_regression
+        BenchmarkRun("octopus_daemon", {"server": None, "socket": None}),
+    ]
+
+
 def get_all_run_variants() -> List[BenchmarkRun]:
     """
     Get all variants of the benchmark runs that are used in the paper.
@@ -418,6 +491,177 @@ def run_whippersnapper_equiv(benchmarks, variants):
             print(f"{name}: {status}")
 
 
+def run_octopus(
+        file1: Path,
+        file2: Path,
+        options: List[str] = (),
+        env: dict[str, str] = None,
+) -> subprocess.CompletedProcess:
+    """
+    Run Octopus on two P4 files, writing the certificate to a temporary file.
+
+    :param file1: the first P4 file
+    :param file2: the second P4 file
+    :param options: the command-line options to pass
+    :param env: the environment to run Octopus in, defaults to the current one
+    :return: the completed Octopus process
+    """
+    with tempfile.NamedTemporaryFile() as tmp:
+        cmd = [
+            "python3", "-m", "octopus.main",
+            "--output", tmp.name,
+            *options,
+            str(file1), str(file2),
+        ]
+
+        return subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=env,
+        )
+
+
+def get_verdict(result: subprocess.CompletedProcess) -> str:
+    """
+    Get the verdict of an Octopus run from its conclusion.
+
+    :param result: the completed Octopus process
+    :return: 'equivalent', 'NOT equivalent', or a description of the failure
+    """
+    match = CONCLUSION_RE.search(result.stdout)
+    if result.returncode != 0 or not match:
+        return f"error (exit code {result.returncode})"
+    return "NOT equivalent" if match.group(1) else "equivalent"
+
+
+@contextlib.contextmanager
+def run_daemon(socket_path: Path):
+    """
+    Run an Octopus daemon in the background, until the context is exited.
+
+    :param socket_path: the path of the socket for the daemon to listen on
+    """
+    daemon = subprocess.Popen(
+        ["python3", "-m", "octopus.main", "--daemon", "--socket", str(socket_path)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if daemon.poll() is not None:
+                raise RuntimeError("The Octopus daemon exited during startup")
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(str(socket_path))
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        yield
+    finally:
+        daemon.send_signal(signal.SIGINT)
+        daemon.wait()
+
+
+def run_regression(benchmarks, variants) -> bool:
+    """
+    Check that all variants reach the same verdict on every benchmark.
+
+    A daemon is started for the variants that use one.
+
+    :param benchmarks: the benchmarks to check
+    :param variants: the variants to compare, the first one being the reference
+    :return: whether all variants agreed on all benchmarks
+    """
+    results = []
+    with contextlib.ExitStack() as stack:
+        tmp_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        socket_path = Path(tmp_dir) / "octopus.sock"
+        if any("server" in variant.arguments for variant in variants):
+            stack.enter_context(run_daemon(socket_path))
+
+        pbar = stack.enter_context(
+            tqdm(total=len(benchmarks) * len(variants), desc="Regression checks")
+        )
+        for b in benchmarks:
+            pbar.set_postfix_str(b.name)
+            verdicts = []
+            for variant in variants:
+                arguments = {**variant.arguments, **(b.arguments or {})}
+                if "server" in arguments:
+                    arguments["socket"] = socket_path
+                options = []
+                for k, v in arguments.items():
+                    options.append(f"--{k}")
+                    if v is not None:
+                        options.append(str(v))
+                verdicts.append(get_verdict(run_octopus(b.file1, b.file2, options)))
+                pbar.update(1)
+            results.append((b.name, verdicts))
+
+    print(f"\n=== {' / '.join(v.name for v in variants)} ===")
+    mismatches = 0
+    for name, verdicts in results:
+        agree = len(set(verdicts)) == 1
+        mismatches += not agree
+        status = verdicts[0] if agree else "MISMATCH: " + " / ".join(verdicts)
+        print(f"{name:<70} {status}")
+    print(f"{len(results) - mismatches}/{len(results)} pairs agree")
+    return mismatches == 0
+
+
+def run_cache_checks() -> bool:
+    """
+    Check that the IR cache is used, and that it is sensitive to included files.
+
+    The checks run with an empty cache in a temporary home directory.
+
+    :return: whether all checks passed
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(os.environ, HOME=tmp_dir)
+        env.pop("OCTOPUS_NO_CACHE", None)
+        file1 = Path("tests/correct_cases/extended_syntax/mpls_default.p4")
+        file2 = Path("tests/correct_cases/extended_syntax/mpls_extended.p4")
+
+        first = run_octopus(file1, file2, ["-vv"], env)
+        second = run_octopus(file1, file2, ["-vv"], env)
+        results.append((
+            "cache_miss_then_hit",
+            get_verdict(first) == get_verdict(second) == "equivalent"
+            and not CACHE_HIT_RE.search(first.stderr)
+            and len(CACHE_HIT_RE.findall(second.stderr)) == 2,
+        ))
+
+        # Two programs with the same text, including different header types
+        programs = {}
+        for name, size in (("four", 4), ("eight", 8)):
+            directory = Path(tmp_dir) / name
+            directory.mkdir()
+            (directory / "main.p4").write_text(INCLUDE_MAIN_P4)
+            (directory / "hdr.p4").write_text(f"header hdr_t {{ bit<{size}> hello; }}\n")
+            programs[name] = directory / "main.p4"
+
+        reference = Path("tests/correct_cases/hello-octopus.p4")
+        results.append((
+            "include_equivalent",
+            get_verdict(run_octopus(reference, programs["four"], env=env))
+            == "equivalent",
+        ))
+        results.append((
+            "include_not_equivalent",
+            get_verdict(run_octopus(reference, programs["eight"], env=env))
+            == "NOT equivalent",
+        ))
+
+    print("\n=== IR cache ===")
+    for name, success in results:
+        print(f"{name}: {'passed' if success else 'FAILED'}")
+    return all(success for _, success in results)
+
+
 def plot(results):
     data = {"field": [], "header": [], "complex": []}
     pattern = re.compile(r'parse_(field|header|complex)_(\d+)(?:_(\d+))?')
@@ -563,7 +807,9 @@ def main() -> None:
 
     parser.add_argument(
         "--suite",
-        choices=["leapfrog", "whippersnapper", "whippersnapper_equiv"],
+        choices=[
+            "leapfrog", "whippersnapper", "whippersnapper_equiv", "regression", "cache"
+        ],
         required=True,
     )
     parser.add_argument("--benchmark", nargs="+")
@@ -571,12 +817,17 @@ def main() -> None:
 
     args = parser.parse_args()
 
+    if args.suite == "cache":
+        sys.exit(0 if run_cache_checks() else 1)
+
     if args.suite == "leapfrog":
         all_benchmarks = get_leapfrog_benchmarks()
     elif args.suite == "whippersnapper":
         all_benchmarks = get_whippersnapper_benchmarks()
     elif args.suite == "whippersnapper_equiv":
         all_benchmarks = get_whippersnapper_equiv_benchmarks()
+    elif args.suite == "regression":
+        all_benchmarks = get_regression_benchmarks()
     else:
         raise ValueError(f"Unknown suite: {args.suite}")
 
@@ -589,7 +840,10 @@ def main() -> None:
     else:
         selected_benchmarks = all_benchmarks
 
-    all_variants = get_all_run_variants()
+    if args.suite == "regression":
+        all_variants = get_regression_variants()
+    else:
+        all_variants = get_all_run_variants()
     if args.variant:
         selected_variants = [v for v in all_variants if v.name in args.variant]
         invalid = set(args.variant) - {v.name for v in all_variants}
@@ -613,6 +867,8 @@ def main() -> None:
         run_whippersnapper(selected_benchmarks, selected_variants)
     elif args.suite == "whippersnapper_equiv":
         run_whippersnapper_equiv(selected_benchmarks, selected_variants)
+    elif args.suite == "regression":
+        sys.exit(0 if run_regression(selected_benchmarks, selected_variants) else 1)
 
 
 if __name__ == "__main__":
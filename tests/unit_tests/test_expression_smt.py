@@ -0,0 +1,56 @@
+import pysmt.shortcuts as pysmt
+import pytest
+
+from bisimulation.formula import Variable
+from program.expression import BVAnd, Concatenate, Constant, Slice
+
+
+def naive_smt(node):
+    """Lower an expression without any of the simplifications of to_smt()."""
+    if isinstance(node, BVAnd):
+        return pysmt.BVAnd(naive_smt(node.left), naive_smt(node.right))
+    if isinstance(node, Concatenate):
+        return pysmt.BVConcat(naive_smt(node.left), naive_smt(node.right))
+    if isinstance(node, Slice):
+        return pysmt.BVExtract(naive_smt(node.reference), node.lsb, node.msb)
+    return node.to_smt()
+
+
+def assert_same_smt(node):
+    assert pysmt.is_valid(
+        pysmt.Equals(node.to_smt(), naive_smt(node)), solver_name="z3"
+    )
+
+
+x = Variable("x", 8)
+y = Variable("y", 8)
+
+OPERANDS = [
+    x,
+    Slice(Concatenate(x, y), 11, 4),
+    Concatenate(Slice(x, 3, 0), Slice(y, 7, 4)),
+    Concatenate(Constant(0b1010, 4), Slice(x, 7, 4)),
+]
+
+MASKS = [0x00, 0xFF, 0x01, 0x80, 0x0F, 0xF0, 0x3C, 0xA5, 0x5A, 0x7E]
+
+
+@pytest.mark.parametrize("operand", OPERANDS, ids=str)
+@pytest.mark.parametrize("mask", MASKS, ids=hex)
+def test_masked_lowering(operand, mask):
+    assert_same_smt(BVAnd(operand, Constant(mask, 8)))
+    assert_same_smt(BVAnd(Constant(mask, 8), operand))
+
+
+@pytest.mark.parametrize(
+    "node",
+    [
+        Concatenate(Slice(x, 7, 4), Slice(x, 3, 0)),
+        Concatenate(Constant(1, 4), Concatenate(Constant(2, 4), x)),
+        Concatenate(Slice(Concatenate(x, y), 15, 8), Slice(y, 7, 0)),
+        Slice(Concatenate(x, Concatenate(y, x)), 19, 4),
+    ],
+    ids=str,
+)
+def test_concatenation_lowering(node):
+    assert_same_smt(node)
@@ -0,0 +1,76 @@
+import subprocess
+
+import pytest
+
+from octopus import main
+
+MAIN_P4 = b'#include <core.p4>\n#include "hdr.p4"\n\nparser P(packet_in pkt, out h_t hdr) {}\n'
+
+
+@pytest.fixture(autouse=True)
+def p4c_graphs_version(monkeypatch):
+    monkeypatch.delenv("OCTOPUS_NO_CACHE", raising=False)
+    monkeypatch.setattr(main, "_get_p4c_graphs_version", lambda: "p4c-graphs 1.0\n")
+
+
+def write_program(directory, header):
+    directory.mkdir()
+    (directory / "main.p4").write_bytes(MAIN_P4)
+    (directory / "hdr.p4").write_bytes(header)
+    return str(directory / "main.p4")
+
+
+def test_cache_key_stable(tmp_path):
+    file1 = write_program(tmp_path / "a", b"header h_t { bit<4> f; }\n")
+    file2 = write_program(tmp_path / "b", b"header h_t { bit<4> f; }\n")
+
+    assert main._get_ir_cache_path(file1) == main._get_ir_cache_path(file1)
+    assert main._get_ir_cache_path(file1) == main._get_ir_cache_path(file2)
+
+
+def test_cache_key_depends_on_includes(tmp_path):
+    file1 = write_program(tmp_path / "a", b"header h_t { bit<4> f; }\n")
+    file2 = write_program(tmp_path / "b", b"header h_t { bit<8> f; }\n")
+
+    assert main._get_ir_cache_path(file1) != main._get_ir_cache_path(file2)
+
+
+def test_cache_key_depends_on_nested_includes(tmp_path):
+    file1 = write_program(tmp_path / "a", b'#include "inner.p4"\n')
+    file2 = write_program(tmp_path / "b", b'#include "inner.p4"\n')
+    (tmp_path / "a" / "inner.p4").write_bytes(b"header h_t { bit<4> f; }\n")
+    (tmp_path / "b" / "inner.p4").write_bytes(b"header h_t { bit<8> f; }\n")
+
+    assert main._get_ir_cache_path(file1) != main._get_ir_cache_path(file2)
+
+
+def test_cache_key_handles_include_cycles(tmp_path):
+    file = write_program(tmp_path / "a", b'#include "main.p4"\n')
+
+    assert main._get_ir_cache_path(file) is not None
+
+
+def test_no_cache_for_macro_include(tmp_path):
+    file = tmp_path / "main.p4"
+    file.write_bytes(b'#define HDR "hdr.p4"\n#include HDR\n')
+
+    assert main._get_ir_cache_path(str(file)) is None
+
+
+def test_no_cache_without_p4c_graphs_version(tmp_path, monkeypatch):
+    def fail():
+        raise subprocess.CalledProcessError(1, ["p4c-graphs", "--version"])
+
+    monkeypatch.setattr(main, "_get_p4c_graphs_version", fail)
+    file = write_program(tmp_path / "a", b"header h_t { bit<4> f; }\n")
+
+    assert main._get_ir_cache_path(file) is None
+
+
+def test_cache_key_depends_on_parsed_object_types(tmp_path, monkeypatch):
+    file = write_program(tmp_path / "a", b"header h_t { bit<4> f; }\n")
+    path = main._get_ir_cache_path(file)
+
+    monkeypatch.setattr(main, "_get_parsed_object_types", lambda: ["P4Parser"])
+
+    assert main._get_ir_cache_path(file) != path
@@ -0,0 +1,58 @@
+import pysmt.shortcuts as pysmt
+import pytest
+
+from bisimulation.bisimulation import _drop_subsumed
+from bisimulation.formula import TRUE, Equals, GuardedFormula, PureFormula, Variable
+from program.expression import Constant
+
+x = Variable("hdr_l.x", 8)
+
+
+@pytest.fixture
+def solver():
+    s = pysmt.Solver(name="z3")
+    yield s
+    s.exit()
+
+
+def guarded(root, state="start", prev=None):
+    return GuardedFormula(
+        state_left=state,
+        state_right=state,
+        buffer_length_left=0,
+        buffer_length_right=0,
+        pure_formula=PureFormula(root),
+        prev_guarded_formula=prev,
+    )
+
+
+def test_drops_weaker_known_formula(solver):
+    initial = guarded(TRUE())
+    known = guarded(Equals(x, Constant(1, 8)), prev=initial)
+    knowledge = {initial, known}
+
+    _drop_subsumed(solver, knowledge, guarded(TRUE(), prev=initial), {})
+
+    assert knowledge == {initial}
+
+
+def test_keeps_stronger_known_formula(solver):
+    initial = guarded(TRUE())
+    known = guarded(TRUE(), prev=initial)
+    knowledge = {initial, known}
+
+    _drop_subsumed(
+        solver, knowledge, guarded(Equals(x, Constant(1, 8)), prev=initial), {}
+    )
+
+    assert knowledge == {initial, known}
+
+
+def test_keeps_known_formula_with_other_guard(solver):
+    initial = guarded(TRUE())
+    known = guarded(Equals(x, Constant(1, 8)), state="parse_x", prev=initial)
+    knowledge = {initial, known}
+
+    _drop_subsumed(solver, knowledge, guarded(TRUE(), prev=initial), {})
+
+    assert knowledge == {initial, known}